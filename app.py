@@ -1,24 +1,50 @@
 import os
-from flask import Flask, render_template, request, redirect, url_for, flash, abort
-from datetime import datetime
+import re
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from flask import Flask, render_template, request, redirect, url_for, flash, abort, session, make_response, jsonify
+from flask_compress import Compress
+from werkzeug.http import parse_etags
 import models
+import atexit
 import logging
-from logging.handlers import RotatingFileHandler
-import sqlite3
+import queue
+from logging.handlers import RotatingFileHandler, QueueHandler, QueueListener
 
 # Basic logging to file and console for easier debugging of server errors
 # Use a rotating file handler to avoid unbounded log growth
 handler = RotatingFileHandler('app.log', maxBytes=5 * 1024 * 1024, backupCount=5)
 formatter = logging.Formatter('%(asctime)s %(levelname)s %(name)s: %(message)s')
 handler.setFormatter(formatter)
+# Request threads only enqueue records; a background listener thread does
+# the file/console writes and rotation, keeping disk I/O off error paths.
+log_queue = queue.Queue(-1)
+log_listener = QueueListener(log_queue, handler, logging.StreamHandler(), respect_handler_level=True)
+log_listener.start()
+atexit.register(log_listener.stop)
 root = logging.getLogger()
 root.setLevel(logging.INFO)
-root.addHandler(handler)
-root.addHandler(logging.StreamHandler())
+root.addHandler(QueueHandler(log_queue))
 
 app = Flask(__name__)
 app.config['SECRET_KEY'] = os.environ.get('SESSION_SECRET', 'dev-secret-key')
 
+# Compress text responses (gzip/br, chosen from Accept-Encoding). Pages
+# under COMPRESS_MIN_SIZE bytes are not worth the overhead and go out as-is.
+app.config['COMPRESS_MIMETYPES'] = ['text/html', 'text/css', 'application/javascript', 'application/json']
+app.config['COMPRESS_LEVEL'] = 6
+app.config['COMPRESS_MIN_SIZE'] = 500
+Compress(app)
+
+# Compile every template up front so the first hit on each page does not
+# pay the Jinja parse/compile cost. Compiled templates are cached by the
+# environment; Flask only re-checks them for changes in debug mode.
+for template_name in app.jinja_env.list_templates(extensions=['html']):
+    app.jinja_env.get_template(template_name)
+
 # Initialize database and seed default data
 models.init_db()
 models.seed_default_categories()
@@ -37,27 +63,148 @@ def app_startup_maintenance():
 # Run startup maintenance now (avoid relying on Flask decorator compatibility)
 app_startup_maintenance()
 
+@app.teardown_appcontext
+def release_db(exc):
+    """Keep the pooled connection but never leave a transaction open on it."""
+    models.release_conn()
+
+# Worker threads used to run independent read queries concurrently. Each
+# thread reads through its own pooled connection (see models.get_conn) and
+# the DB runs in WAL mode, so readers on different threads do not block
+# each other.
+_query_pool = ThreadPoolExecutor(max_workers=8, thread_name_prefix='db-read')
+
+def wants_json():
+    """True when the client prefers a JSON reply over an HTML page."""
+    return request.accept_mimetypes.best == 'application/json'
+
+def respond(message, category, endpoint, **values):
+    """Finish a form/mutation request.
+
+    Browsers get the message flashed and a redirect to ``endpoint``. API
+    clients sending ``Accept: application/json`` get the outcome as JSON
+    instead, which skips the flash and so the signed session cookie.
+    """
+    if wants_json():
+        ok = category == 'success'
+        return jsonify(ok=ok, message=message), 200 if ok else 400
+    flash(message, category)
+    return redirect(url_for(endpoint, **values))
+
+# Rendered list pages keyed by (ETag, query string). The ETag carries the
+# table versions the page was built from, so any write makes older
+# entries unreachable; those age out by TTL or are evicted least recently
+# used once the cache is full. The query string is client-controlled, so
+# the cache is bounded by the total size of the bodies it holds, not only
+# by their number.
+_PAGE_CACHE = OrderedDict()
+_PAGE_CACHE_MAX = 1024
+_PAGE_CACHE_MAX_CHARS = 32 * 1024 * 1024  # total length of cached bodies
+_PAGE_CACHE_TTL = 30  # seconds
+_page_cache_lock = threading.Lock()
+_page_cache_chars = 0
+
+def _page_cache_pop(key, last=None):
+    """Remove ``key`` (or the oldest entry if ``last`` is False); lock held."""
+    global _page_cache_chars
+    if last is None:
+        body, _ = _PAGE_CACHE.pop(key)
+    else:
+        _, (body, _) = _PAGE_CACHE.popitem(last=last)
+    _page_cache_chars -= len(body)
+
+def _page_cache_get(key):
+    with _page_cache_lock:
+        entry = _PAGE_CACHE.get(key)
+        if entry is None:
+            return None
+        body, ts = entry
+        if time.time() - ts > _PAGE_CACHE_TTL:
+            _page_cache_pop(key)
+            return None
+        _PAGE_CACHE.move_to_end(key)
+        return body
+
+def _page_cache_set(key, body):
+    global _page_cache_chars
+    # A page too big to share the budget with others is not worth holding
+    if len(body) > _PAGE_CACHE_MAX_CHARS // 16:
+        return
+    with _page_cache_lock:
+        if key in _PAGE_CACHE:
+            _page_cache_pop(key)
+        _PAGE_CACHE[key] = (body, time.time())
+        _page_cache_chars += len(body)
+        while len(_PAGE_CACHE) > _PAGE_CACHE_MAX or _page_cache_chars > _PAGE_CACHE_MAX_CHARS:
+            _page_cache_pop(None, last=False)
+
+# Some Flask-Compress versions (1.15 among them) append the encoding to
+# every tag they compress, weak ones included: W/"books-3-1:gzip". Clients
+# send that form back, so drop the suffix before comparing.
+_ETAG_ENCODING_SUFFIX = re.compile(r':[A-Za-z0-9-]+"')
+
+def etag_matches(etag):
+    """True if the request's If-None-Match (weakly) matches ``etag``."""
+    header = request.headers.get('If-None-Match')
+    if not header:
+        return False
+    return parse_etags(_ETAG_ENCODING_SUFFIX.sub('"', header)).contains_weak(etag)
+
+def conditional(*tables, extra=None):
+    """Serve a list view with an ETag built from the tables it reads.
+
+    The tag changes whenever any of the tables is written, so a client
+    revalidating with If-None-Match gets a bare 304 without the view
+    querying or rendering anything. Other clients asking for the same
+    page and query string get the already rendered HTML from the page
+    cache. ``extra`` is an optional callable whose result is folded into
+    the tag for state that changes without a write.
+    """
+    def decorator(view):
+        @functools.wraps(view)
+        def wrapper(*args, **kwargs):
+            # Pending flash messages are rendered into the page, so that
+            # response must always be built fresh.
+            if '_flashes' in session:
+                return view(*args, **kwargs)
+
+            parts = [request.endpoint, *models.get_table_versions(*tables)]
+            if extra is not None:
+                parts.append(extra())
+            etag = '-'.join(str(p) for p in parts)
+
+            # The tag is weak: it identifies the page's data, not its bytes,
+            # so it stays valid across gzip/br encodings of the same page
+            # (Flask-Compress rewrites strong tags per encoding).
+            if etag_matches(etag):
+                response = app.response_class(status=304)
+            else:
+                key = (etag, request.query_string)
+                body = _page_cache_get(key)
+                if body is None:
+                    body = view(*args, **kwargs)
+                    if isinstance(body, str):
+                        _page_cache_set(key, body)
+                response = make_response(body)
+            response.set_etag(etag, weak=True)
+            # Allow caching but make the browser revalidate every time
+            response.cache_control.no_cache = True
+            return response
+        return wrapper
+    return decorator
+
 @app.route('/')
 def index():
-    total_books = models.get_total_books()
-    total_borrowers = models.get_total_borrowers()
-    active_loans = models.get_total_active_loans()
-    available_books = models.get_total_available_books()
-    
-    recent_loans = models.get_active_loans()
-    # Add is_overdue flag to each loan
-    now = datetime.utcnow()
-    for loan in recent_loans:
-        loan['is_overdue'] = models.is_loan_overdue(loan, now)
-    
-    return render_template('index.html', 
-                         total_books=total_books,
-                         total_borrowers=total_borrowers,
-                         active_loans=active_loans,
-                         available_books=available_books,
-                         recent_loans=recent_loans)
+    # The totals come from one compound query; overlap it with the recent
+    # loans query on the shared worker pool.
+    stats_future = _query_pool.submit(models.get_dashboard_stats)
+    loans_future = _query_pool.submit(models.get_active_loans)
+    return render_template('index.html',
+                         recent_loans=loans_future.result(),
+                         **stats_future.result())
 
 @app.route('/books')
+@conditional('books', 'categories')
 def books():
     search = request.args.get('search', '')
     category_filter = request.args.get('category', '')
@@ -67,48 +214,56 @@ def books():
     
     return render_template('books.html', books=books, categories=categories)
 
-@app.route('/books/add', methods=['GET', 'POST'])
-def add_book():
-    if request.method == 'POST':
-        title = request.form.get('title')
-        if not title or not title.strip():
-            flash('Title is required.', 'danger')
-            return redirect(url_for('add_book'))
+def parse_book_form(form, default_quantity=None):
+    """Validate the add/edit book form.
 
-        isbn = request.form.get('isbn') or None
+    Returns ``(fields, None)`` where ``fields`` holds the keyword arguments
+    for models.add_book/update_book, or ``(None, message)`` for the first
+    invalid field. ``default_quantity`` is used when quantity is omitted;
+    without it the field is required.
+    """
+    title = (form.get('title') or '').strip()
+    if not title:
+        return None, 'Title is required.'
 
-        category_id_str = request.form.get('category_id')
-        try:
-            category_id = int(category_id_str) if category_id_str else None
-        except (TypeError, ValueError):
-            flash('Invalid category selected.', 'danger')
-            return redirect(url_for('add_book'))
-        # Validate category exists if provided
-        if category_id is not None and not models.get_category_by_id(category_id):
-            flash('Selected category does not exist.', 'danger')
-            return redirect(url_for('add_book'))
+    category_id_str = form.get('category_id')
+    try:
+        category_id = int(category_id_str) if category_id_str else None
+    except ValueError:
+        return None, 'Invalid category selected.'
+    # Validate category exists if provided
+    if category_id is not None and not models.get_category_by_id(category_id):
+        return None, 'Selected category does not exist.'
+
+    quantity_raw = form.get('quantity') or default_quantity
+    if quantity_raw is None:
+        return None, 'Quantity is required.'
+    try:
+        quantity = int(quantity_raw)
+    except ValueError:
+        return None, 'Quantity must be a number.'
+    if quantity < 0:
+        return None, 'Quantity must be non-negative.'
+
+    return {
+        'title': title,
+        'isbn': form.get('isbn') or None,
+        'category_id': category_id,
+        'author_name': form.get('author_name') or None,
+        'publisher_name': form.get('publisher_name') or None,
+        'quantity': quantity,
+    }, None
 
-        author_name = request.form.get('author_name') or None
-        publisher_name = request.form.get('publisher_name') or None
+@app.route('/books/add', methods=['GET', 'POST'])
+def add_book():
+    if request.method == 'POST':
+        fields, error = parse_book_form(request.form, default_quantity='1')
+        if error:
+            return respond(error, 'danger', 'add_book')
 
-        try:
-            quantity_raw = request.form.get('quantity', '1')
-            quantity = int(quantity_raw)
-            if quantity < 0:
-                raise ValueError('quantity')
-        except (TypeError, ValueError):
-            flash('Quantity must be a non-negative integer.', 'danger')
-            return redirect(url_for('add_book'))
+        models.add_book(**fields)
 
-        try:
-            models.add_book(title.strip(), isbn, category_id, author_name, publisher_name, quantity)
-        except Exception:
-            logging.exception('Failed to add book')
-            flash('Failed to add book. See server logs for details.', 'danger')
-            return redirect(url_for('add_book'))
-
-        flash('Book added successfully!', 'success')
-        return redirect(url_for('books'))
+        return respond('Book added successfully!', 'success', 'books')
     
     categories = models.get_all_categories()
     
@@ -121,50 +276,18 @@ def edit_book(id):
         abort(404)
     
     if request.method == 'POST':
-        title = request.form.get('title')
-        isbn = request.form.get('isbn') or None
-        
-        category_id_str = request.form.get('category_id')
-        try:
-            category_id = int(category_id_str) if category_id_str else None
-        except (TypeError, ValueError):
-            flash('Invalid category selected.', 'danger')
-            return redirect(url_for('edit_book', id=id))
-        # Validate category exists if provided
-        if category_id is not None and not models.get_category_by_id(category_id):
-            flash('Selected category does not exist.', 'danger')
-            return redirect(url_for('edit_book', id=id))
-        
-        author_name = request.form.get('author_name') or None
-        publisher_name = request.form.get('publisher_name') or None
-        # Validate quantity
-        try:
-            new_quantity_raw = request.form.get('quantity')
-            if new_quantity_raw is None or new_quantity_raw == '':
-                flash('Quantity is required.', 'danger')
-                return redirect(url_for('edit_book', id=id))
-            new_quantity = int(new_quantity_raw)
-            if new_quantity < 0:
-                flash('Quantity must be non-negative.', 'danger')
-                return redirect(url_for('edit_book', id=id))
-        except ValueError:
-            flash('Quantity must be a number.', 'danger')
-            return redirect(url_for('edit_book', id=id))
+        fields, error = parse_book_form(request.form)
+        if error:
+            return respond(error, 'danger', 'edit_book', id=id)
 
         # Get active loans count from the update function
-        try:
-            active_loans = models.update_book(id, title, isbn, category_id, author_name, publisher_name, new_quantity)
-        except Exception as e:
-            logging.exception('Error updating book %s', id)
-            flash('An error occurred while updating the book. See server logs for details.', 'danger')
-            return redirect(url_for('edit_book', id=id))
+        active_loans = models.update_book(id, **fields)
 
+        new_quantity = fields['quantity']
         if new_quantity < active_loans:
-            flash(f'Cannot set quantity to {new_quantity}. There are {active_loans} active loans for this book.', 'danger')
-            return redirect(url_for('edit_book', id=id))
+            return respond(f'Cannot set quantity to {new_quantity}. There are {active_loans} active loans for this book.', 'danger', 'edit_book', id=id)
 
-        flash('Book updated successfully!', 'success')
-        return redirect(url_for('books'))
+        return respond('Book updated successfully!', 'success', 'books')
     
     categories = models.get_all_categories()
     
@@ -173,31 +296,15 @@ def edit_book(id):
 @app.route('/books/delete/<int:id>')
 def delete_book(id):
     # Prevent deleting a book that has any loans (active or returned)
-    try:
-        loans_count = models.get_loans_count_for_book(id)
-        if loans_count and loans_count > 0:
-            flash('Cannot delete book while loans reference it. Return or delete loans first.', 'danger')
-            return redirect(url_for('books'))
+    loans_count = models.get_loans_count_for_book(id)
+    if loans_count and loans_count > 0:
+        return respond('Cannot delete book while loans reference it. Return or delete loans first.', 'danger', 'books')
 
-        try:
-            models.delete_book(id)
-        except sqlite3.IntegrityError:
-            logging.exception('IntegrityError deleting book %s', id)
-            flash('Cannot delete book due to database constraints.', 'danger')
-            return redirect(url_for('books'))
-        except Exception:
-            logging.exception('Failed to delete book %s', id)
-            flash('Failed to delete book.', 'danger')
-            return redirect(url_for('books'))
-
-        flash('Book deleted successfully!', 'success')
-        return redirect(url_for('books'))
-    except Exception:
-        logging.exception('Error checking loans for book %s', id)
-        flash('Failed to delete book. See server logs for details.', 'danger')
-        return redirect(url_for('books'))
+    models.delete_book(id)
+    return respond('Book deleted successfully!', 'success', 'books')
 
 @app.route('/categories')
+@conditional('categories', 'book_links')
 def categories():
     categories = models.get_all_categories()
     return render_template('categories.html', categories=categories)
@@ -206,18 +313,11 @@ def categories():
 def add_category_route():
     name = request.form.get('name')
     if not name or not name.strip():
-        flash('Category name is required.', 'danger')
-        return redirect(url_for('categories'))
+        return respond('Category name is required.', 'danger', 'categories')
 
-    try:
-        models.add_category(name.strip())
-    except Exception:
-        logging.exception('Failed to add category')
-        flash('Failed to add category. It may already exist or there was a server error.', 'danger')
-        return redirect(url_for('categories'))
+    models.add_category(name.strip())
 
-    flash('Category added successfully!', 'success')
-    return redirect(url_for('categories'))
+    return respond('Category added successfully!', 'success', 'categories')
 
 @app.route('/categories/edit/<int:id>', methods=['GET', 'POST'])
 def edit_category(id):
@@ -228,40 +328,25 @@ def edit_category(id):
     if request.method == 'POST':
         name = request.form.get('name')
         if not name or not name.strip():
-            flash('Category name is required.', 'danger')
-            return redirect(url_for('edit_category', id=id))
+            return respond('Category name is required.', 'danger', 'edit_category', id=id)
 
-        try:
-            models.update_category(id, name.strip())
-        except Exception:
-            logging.exception('Failed to update category %s', id)
-            flash('Failed to update category.', 'danger')
-            return redirect(url_for('edit_category', id=id))
+        models.update_category(id, name.strip())
 
-        flash('Category updated successfully!', 'success')
-        return redirect(url_for('categories'))
+        return respond('Category updated successfully!', 'success', 'categories')
     
     return render_template('edit_category.html', category=category)
 
 @app.route('/categories/delete/<int:id>')
 def delete_category(id):
     # Prevent deleting a category that has books
-    try:
-        books_in_cat = models.get_all_books('', id)
-        if books_in_cat and len(books_in_cat) > 0:
-            flash('Cannot delete category while books reference it. Remove or reassign books first.', 'danger')
-            return redirect(url_for('categories'))
+    if models.category_has_books(id):
+        return respond('Cannot delete category while books reference it. Remove or reassign books first.', 'danger', 'categories')
 
-        models.delete_category(id)
-    except Exception:
-        logging.exception('Failed to delete category %s', id)
-        flash('Failed to delete category.', 'danger')
-        return redirect(url_for('categories'))
-
-    flash('Category deleted successfully!', 'success')
-    return redirect(url_for('categories'))
+    models.delete_category(id)
+    return respond('Category deleted successfully!', 'success', 'categories')
 
 @app.route('/authors')
+@conditional('authors', 'book_links')
 def authors():
     authors = models.get_all_authors()
     return render_template('authors.html', authors=authors)
@@ -270,17 +355,10 @@ def authors():
 def add_author_route():
     name = request.form.get('name')
     if not name or not name.strip():
-        flash('Author name is required.', 'danger')
-        return redirect(url_for('authors'))
-    try:
-        models.add_author(name.strip())
-    except Exception:
-        logging.exception('Failed to add author')
-        flash('Failed to add author.', 'danger')
-        return redirect(url_for('authors'))
+        return respond('Author name is required.', 'danger', 'authors')
+    models.add_author(name.strip())
 
-    flash('Author added successfully!', 'success')
-    return redirect(url_for('authors'))
+    return respond('Author added successfully!', 'success', 'authors')
 
 @app.route('/authors/edit/<int:id>', methods=['GET', 'POST'])
 def edit_author(id):
@@ -291,44 +369,27 @@ def edit_author(id):
     if request.method == 'POST':
         name = request.form.get('name')
         if not name or not name.strip():
-            flash('Author name is required.', 'danger')
-            return redirect(url_for('edit_author', id=id))
-        try:
-            models.update_author(id, name.strip())
-        except Exception:
-            logging.exception('Failed to update author %s', id)
-            flash('Failed to update author.', 'danger')
-            return redirect(url_for('edit_author', id=id))
+            return respond('Author name is required.', 'danger', 'edit_author', id=id)
+        models.update_author(id, name.strip())
 
-        flash('Author updated successfully!', 'success')
-        return redirect(url_for('authors'))
+        return respond('Author updated successfully!', 'success', 'authors')
     
     return render_template('edit_author.html', author=author)
 
 @app.route('/authors/delete/<int:id>')
 def delete_author(id):
-    # Prevent deleting author if books reference the author by name
-    try:
-        author = models.get_author_by_id(id)
-        if not author:
-            abort(404)
-        author_name = author.get('name')
-        all_books = models.get_all_books()
-        referencing = [b for b in all_books if b.get('author_name') == author_name]
-        if referencing:
-            flash('Cannot delete author while books reference them. Reassign or remove those books first.', 'danger')
-            return redirect(url_for('authors'))
-
-        models.delete_author(id)
-    except Exception:
-        logging.exception('Failed to delete author %s', id)
-        flash('Failed to delete author.', 'danger')
-        return redirect(url_for('authors'))
+    # Prevent deleting author if books reference the author
+    author = models.get_author_by_id(id)
+    if not author:
+        abort(404)
+    if models.book_exists_for_author(id):
+        return respond('Cannot delete author while books reference them. Reassign or remove those books first.', 'danger', 'authors')
 
-    flash('Author deleted successfully!', 'success')
-    return redirect(url_for('authors'))
+    models.delete_author(id)
+    return respond('Author deleted successfully!', 'success', 'authors')
 
 @app.route('/publishers')
+@conditional('publishers', 'book_links')
 def publishers():
     publishers = models.get_all_publishers()
     return render_template('publishers.html', publishers=publishers)
@@ -337,17 +398,10 @@ def publishers():
 def add_publisher_route():
     name = request.form.get('name')
     if not name or not name.strip():
-        flash('Publisher name is required.', 'danger')
-        return redirect(url_for('publishers'))
-    try:
-        models.add_publisher(name.strip())
-    except Exception:
-        logging.exception('Failed to add publisher')
-        flash('Failed to add publisher.', 'danger')
-        return redirect(url_for('publishers'))
+        return respond('Publisher name is required.', 'danger', 'publishers')
+    models.add_publisher(name.strip())
 
-    flash('Publisher added successfully!', 'success')
-    return redirect(url_for('publishers'))
+    return respond('Publisher added successfully!', 'success', 'publishers')
 
 @app.route('/publishers/edit/<int:id>', methods=['GET', 'POST'])
 def edit_publisher(id):
@@ -358,44 +412,27 @@ def edit_publisher(id):
     if request.method == 'POST':
         name = request.form.get('name')
         if not name or not name.strip():
-            flash('Publisher name is required.', 'danger')
-            return redirect(url_for('edit_publisher', id=id))
-        try:
-            models.update_publisher(id, name.strip())
-        except Exception:
-            logging.exception('Failed to update publisher %s', id)
-            flash('Failed to update publisher.', 'danger')
-            return redirect(url_for('edit_publisher', id=id))
+            return respond('Publisher name is required.', 'danger', 'edit_publisher', id=id)
+        models.update_publisher(id, name.strip())
 
-        flash('Publisher updated successfully!', 'success')
-        return redirect(url_for('publishers'))
+        return respond('Publisher updated successfully!', 'success', 'publishers')
     
     return render_template('edit_publisher.html', publisher=publisher)
 
 @app.route('/publishers/delete/<int:id>')
 def delete_publisher(id):
-    # Prevent deleting publisher if books reference the publisher by name
-    try:
-        publisher = models.get_publisher_by_id(id)
-        if not publisher:
-            abort(404)
-        publisher_name = publisher.get('name')
-        all_books = models.get_all_books()
-        referencing = [b for b in all_books if b.get('publisher_name') == publisher_name]
-        if referencing:
-            flash('Cannot delete publisher while books reference it. Reassign or remove those books first.', 'danger')
-            return redirect(url_for('publishers'))
-
-        models.delete_publisher(id)
-    except Exception:
-        logging.exception('Failed to delete publisher %s', id)
-        flash('Failed to delete publisher.', 'danger')
-        return redirect(url_for('publishers'))
+    # Prevent deleting publisher if books reference the publisher
+    publisher = models.get_publisher_by_id(id)
+    if not publisher:
+        abort(404)
+    if models.book_exists_for_publisher(id):
+        return respond('Cannot delete publisher while books reference it. Reassign or remove those books first.', 'danger', 'publishers')
 
-    flash('Publisher deleted successfully!', 'success')
-    return redirect(url_for('publishers'))
+    models.delete_publisher(id)
+    return respond('Publisher deleted successfully!', 'success', 'publishers')
 
 @app.route('/borrowers')
+@conditional('borrowers', 'loans')
 def borrowers():
     borrowers = models.get_all_borrowers()
     return render_template('borrowers.html', borrowers=borrowers)
@@ -407,17 +444,10 @@ def add_borrower_route():
         email = request.form.get('email')
         phone = request.form.get('phone')
         if not name or not name.strip():
-            flash('Borrower name is required.', 'danger')
-            return redirect(url_for('add_borrower_route'))
-        try:
-            models.add_borrower(name.strip(), email.strip() if email else None, phone.strip() if phone else None)
-        except Exception:
-            logging.exception('Failed to add borrower')
-            flash('Failed to add borrower.', 'danger')
-            return redirect(url_for('add_borrower_route'))
+            return respond('Borrower name is required.', 'danger', 'add_borrower_route')
+        models.add_borrower(name.strip(), email.strip() if email else None, phone.strip() if phone else None)
 
-        flash('Borrower added successfully!', 'success')
-        return redirect(url_for('borrowers'))
+        return respond('Borrower added successfully!', 'success', 'borrowers')
     
     return render_template('add_borrower.html')
 
@@ -432,60 +462,39 @@ def edit_borrower(id):
         email = request.form.get('email')
         phone = request.form.get('phone')
         if not name or not name.strip():
-            flash('Borrower name is required.', 'danger')
-            return redirect(url_for('edit_borrower', id=id))
-        try:
-            models.update_borrower(id, name.strip(), email.strip() if email else None, phone.strip() if phone else None)
-        except Exception:
-            logging.exception('Failed to update borrower %s', id)
-            flash('Failed to update borrower.', 'danger')
-            return redirect(url_for('edit_borrower', id=id))
+            return respond('Borrower name is required.', 'danger', 'edit_borrower', id=id)
+        models.update_borrower(id, name.strip(), email.strip() if email else None, phone.strip() if phone else None)
 
-        flash('Borrower updated successfully!', 'success')
-        return redirect(url_for('borrowers'))
+        return respond('Borrower updated successfully!', 'success', 'borrowers')
     
     return render_template('edit_borrower.html', borrower=borrower)
 
 @app.route('/borrowers/delete/<int:id>')
 def delete_borrower(id):
+    active_loans, total_loans = models.get_loan_counts_for_borrower(id)
     # Prevent deleting a borrower that has active loans
-    try:
-        active_loans = models.get_active_loans_count_for_borrower(id)
-        if active_loans and active_loans > 0:
-            flash('Cannot delete borrower while active loans exist. Return those books first.', 'danger')
-            return redirect(url_for('borrowers'))
+    if active_loans and active_loans > 0:
+        return respond('Cannot delete borrower while active loans exist. Return those books first.', 'danger', 'borrowers')
 
-        # Also prevent deleting if the borrower has any loan history (FK prevents deletion)
-        total_loans = models.get_loans_count_for_borrower(id)
-        if total_loans and total_loans > 0:
-            flash('Cannot delete borrower: loan history exists. Remove loans first or anonymize the record.', 'danger')
-            return redirect(url_for('borrowers'))
+    # Also prevent deleting if the borrower has any loan history
+    if total_loans and total_loans > 0:
+        return respond('Cannot delete borrower: loan history exists. Remove loans first or anonymize the record.', 'danger', 'borrowers')
 
-        try:
-            models.delete_borrower(id)
-        except sqlite3.IntegrityError:
-            logging.exception('IntegrityError deleting borrower %s', id)
-            flash('Cannot delete borrower due to database constraints.', 'danger')
-            return redirect(url_for('borrowers'))
-        except Exception:
-            logging.exception('Failed to delete borrower %s', id)
-            flash('Failed to delete borrower.', 'danger')
-            return redirect(url_for('borrowers'))
-
-        flash('Borrower deleted successfully!', 'success')
-        return redirect(url_for('borrowers'))
-    except Exception:
-        logging.exception('Error checking loans for borrower %s', id)
-        flash('Failed to delete borrower. See server logs for details.', 'danger')
-        return redirect(url_for('borrowers'))
+    models.delete_borrower(id)
+    return respond('Borrower deleted successfully!', 'success', 'borrowers')
 
 @app.route('/loans')
+# Loans turn overdue with time alone, so the overdue count is part of the tag
+@conditional('loans', 'books', 'borrowers', extra=models.get_total_overdue_loans)
 def loans():
-    loans = models.get_all_loans()
-    # Add is_overdue flag to each loan
-    now = datetime.utcnow()
-    for loan in loans:
-        loan['is_overdue'] = models.is_loan_overdue(loan, now)
+    # The status filter runs in SQL rather than over all loans here
+    status = request.args.get('status', '')
+    if status == 'overdue':
+        loans = models.get_overdue_loans()
+    elif status in ('active', 'returned'):
+        loans = models.get_all_loans(status)
+    else:
+        loans = models.get_all_loans()
     return render_template('loans.html', loans=loans)
 
 @app.route('/loans/add', methods=['GET', 'POST'])
@@ -496,32 +505,16 @@ def add_loan_route():
             book_id = int(request.form.get('book_id'))
             borrower_id = int(request.form.get('borrower_id'))
         except (TypeError, ValueError):
-            flash('Invalid book or borrower selection.', 'danger')
-            return redirect(url_for('add_loan_route'))
+            return respond('Invalid book or borrower selection.', 'danger', 'add_loan_route')
 
-        try:
-            book = models.get_book_by_id(book_id)
-        except Exception:
-            logging.exception('Error fetching book %s', book_id)
-            flash('An internal error occurred.', 'danger')
-            return redirect(url_for('add_loan_route'))
-
-        if book and book.get('available', 0) > 0:
-            try:
-                models.add_loan(book_id, borrower_id)
-            except Exception:
-                logging.exception('Error creating loan for book %s borrower %s', book_id, borrower_id)
-                flash('Failed to create loan; try again.', 'danger')
-                return redirect(url_for('add_loan_route'))
-
-            flash('Book loaned successfully!', 'success')
-            return redirect(url_for('loans'))
-        else:
-            flash('Book is not available!', 'danger')
+        loan_id = models.add_loan(book_id, borrower_id)
+
+        if loan_id is not None:
+            return respond('Book loaned successfully!', 'success', 'loans')
+        return respond('Book is not available!', 'danger', 'add_loan_route')
     
     # Get available books only
-    all_books = models.get_all_books()
-    books = [b for b in all_books if b['available'] > 0]
+    books = models.get_available_books()
     borrowers = models.get_all_borrowers()
     
     return render_template('add_loan.html', books=books, borrowers=borrowers)
@@ -529,8 +522,62 @@ def add_loan_route():
 @app.route('/loans/return/<int:id>')
 def return_loan_route(id):
     models.return_loan(id)
-    flash('Book returned successfully!', 'success')
-    return redirect(url_for('loans'))
+    return respond('Book returned successfully!', 'success', 'loans')
+
+# When a model write fails inside a route: the message to show and the
+# endpoint to send the user back to. Edit routes return to their own form.
+MODEL_ERROR_RESPONSES = {
+    'add_book': ('Failed to add book. See server logs for details.', 'add_book'),
+    'edit_book': ('An error occurred while updating the book. See server logs for details.', 'edit_book'),
+    'delete_book': ('Failed to delete book.', 'books'),
+    'add_category_route': ('Failed to add category. It may already exist or there was a server error.', 'categories'),
+    'edit_category': ('Failed to update category.', 'edit_category'),
+    'delete_category': ('Failed to delete category.', 'categories'),
+    'add_author_route': ('Failed to add author.', 'authors'),
+    'edit_author': ('Failed to update author.', 'edit_author'),
+    'delete_author': ('Failed to delete author.', 'authors'),
+    'add_publisher_route': ('Failed to add publisher.', 'publishers'),
+    'edit_publisher': ('Failed to update publisher.', 'edit_publisher'),
+    'delete_publisher': ('Failed to delete publisher.', 'publishers'),
+    'add_borrower_route': ('Failed to add borrower.', 'add_borrower_route'),
+    'edit_borrower': ('Failed to update borrower.', 'edit_borrower'),
+    'delete_borrower': ('Failed to delete borrower.', 'borrowers'),
+    'add_loan_route': ('Failed to create loan; try again.', 'add_loan_route'),
+    'return_loan_route': ('Failed to return book.', 'loans'),
+}
+
+# More specific messages when the failure was a constraint violation
+INTEGRITY_ERROR_MESSAGES = {
+    'delete_book': 'Cannot delete book due to database constraints.',
+    'delete_borrower': 'Cannot delete borrower due to database constraints.',
+}
+
+def server_error():
+    """500 reply: the error page, or a JSON body for API clients."""
+    if wants_json():
+        return jsonify(ok=False, message='The server encountered an internal error.'), 500
+    return render_template('500.html'), 500
+
+@app.errorhandler(models.ModelError)
+def handle_model_error(e):
+    logging.error('Model error in %s %s', request.endpoint, request.view_args, exc_info=e)
+    if request.endpoint not in MODEL_ERROR_RESPONSES:
+        return server_error()
+
+    message, endpoint = MODEL_ERROR_RESPONSES[request.endpoint]
+    if endpoint == request.endpoint and request.method == 'GET':
+        # A lookup failed while showing the page itself (e.g. the edit
+        # form); redirecting back to it would only fail again
+        return server_error()
+    if isinstance(e, models.IntegrityError):
+        message = INTEGRITY_ERROR_MESSAGES.get(request.endpoint, message)
+    elif wants_json():
+        # Not a constraint the client broke (e.g. a locked or unreadable
+        # database), so API clients get a server error rather than a 400
+        return jsonify(ok=False, message=message), 500
+    # Only pass the URL arguments along when returning to the same page
+    values = request.view_args if endpoint == request.endpoint else {}
+    return respond(message, 'danger', endpoint, **values)
 
 # Generic error handler to log unexpected exceptions and present a friendly message
 @app.errorhandler(Exception)
@@ -542,11 +589,16 @@ def handle_exception(e):
 
     logging.exception('Unhandled exception:')
     # Return a simple message and 500 status
-    return render_template('500.html'), 500
+    return server_error()
 
 
 if __name__ == '__main__':
-    # Disable the auto-reloader when running directly to avoid spawning a
-    # second process that may concurrently access the SQLite file and cause
-    # "database is locked" errors during development.
-    app.run(host='0.0.0.0', port=5000, debug=True, use_reloader=False)
+    # Development server only. In production run the app under a WSGI
+    # server instead, e.g. (see wsgi.py / Procfile):
+    #   gunicorn -w 4 -k gthread --threads 8 wsgi:app
+    # Debug mode (interactive debugger, tracebacks in responses) is opt-in
+    # via FLASK_DEBUG=1. The auto-reloader stays disabled to avoid spawning
+    # a second process that may concurrently access the SQLite file and
+    # cause "database is locked" errors during development.
+    debug = os.environ.get('FLASK_DEBUG', '').lower() in ('1', 'true', 'yes')
+    app.run(host='0.0.0.0', port=5000, debug=debug, use_reloader=False, threaded=True)
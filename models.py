@@ -1,666 +1,1188 @@
 import sqlite3
-import time
+import threading
 import functools
-from datetime import datetime, timedelta
+import queue
+from concurrent.futures import Future, wait, FIRST_COMPLETED
+import atexit
+import weakref
+from contextlib import contextmanager
 
 DB = "library.db"
 
-def get_conn():
-    """Get database connection with foreign keys enabled"""
+# Tables whose writes are counted in table_versions
+VERSIONED_TABLES = ('categories', 'authors', 'publishers', 'books', 'borrowers', 'loans')
+
+# Each thread keeps one open connection and reuses it across calls, so the
+# file open and per-connection PRAGMA setup happen once per thread instead
+# of on every query. Request-path writes do not use them: those go through
+# the writer thread (see write_op below). Only startup setup (init_db,
+# ensure_db_indexes) and scripts such as seed_demo.py write on them.
+_local = threading.local()
+# Every connection handed out, so they can all be closed at interpreter
+# exit. Closing the last connection checkpoints the WAL into the main file.
+# Weak references let connections of finished threads be collected.
+_open_conns = weakref.WeakSet()
+_open_conns_lock = threading.Lock()
+
+class _Connection(sqlite3.Connection):
+    """sqlite3.Connection that can be weakly referenced (see _open_conns)."""
+
+def _connect(db=None):
+    """Open a new database connection with foreign keys enabled"""
     # Increase timeout and allow cross-thread usage. Use a longer timeout so
     # short locks (from concurrent access or the reloader) will be waited on
     # rather than immediately raising "database is locked".
-    conn = sqlite3.connect(DB, check_same_thread=False, timeout=30)
+    # Keep more prepared statements per connection than the default 128; with
+    # connections reused per thread, each hot query is prepared only once.
+    # "file:" names are URIs, e.g. the tests' shared in-memory database.
+    db = db or DB
+    conn = sqlite3.connect(db, check_same_thread=False, timeout=30,
+                           factory=_Connection, cached_statements=256,
+                           uri=db.startswith('file:'))
+    # List queries return these sqlite3.Row objects as-is instead of copying
+    # each into a dict: they support row['col'] (and row.col in Jinja), and
+    # being read-only they are safe to share from the cache.
     conn.row_factory = sqlite3.Row
-    # Enable foreign keys and use WAL journal mode to reduce write locking.
+    # Enable foreign keys and tune the per-connection settings: NORMAL sync
+    # is safe in WAL mode, a 64MB page cache (enough to hold the whole
+    # library DB; it fills lazily, and lives as long as the pooled
+    # connection) and memory-mapped reads keep hot pages out of read()
+    # syscalls, and temp tables/sorts stay in RAM.
     # Also set a busy timeout for good measure.
     try:
         conn.execute("PRAGMA foreign_keys = ON;")
-        conn.execute("PRAGMA journal_mode = WAL;")
         conn.execute("PRAGMA synchronous = NORMAL;")
         conn.execute("PRAGMA busy_timeout = 30000;")
+        conn.execute("PRAGMA cache_size = -65536;")
+        conn.execute("PRAGMA temp_store = MEMORY;")
+        conn.execute("PRAGMA mmap_size = 268435456;")
     except sqlite3.OperationalError:
         # If any PRAGMA fails, continue — the DB will still work with defaults.
         pass
+    with _open_conns_lock:
+        _open_conns.add(conn)
+    return conn
+
+def get_conn():
+    """Get this thread's database connection, opening it on first use"""
+    conn = getattr(_local, 'conn', None)
+    # Reopen if DB was pointed at a different file (e.g. by the tests)
+    if conn is None or _local.db != DB:
+        if conn is not None:
+            conn.close()
+        conn = _connect()
+        _local.conn = conn
+        _local.db = DB
     return conn
 
+def release_conn():
+    """Roll back any transaction left open on this thread's connection.
+
+    The connection itself stays open for reuse.
+    """
+    conn = getattr(_local, 'conn', None)
+    if conn is not None and conn.in_transaction:
+        conn.rollback()
+
+@atexit.register
+def close_all_conns():
+    """Close every connection opened on any thread, including the writer's."""
+    with _open_conns_lock:
+        conns = list(_open_conns)
+        _open_conns.clear()
+    for conn in conns:
+        try:
+            conn.close()
+        except sqlite3.Error:
+            pass
+
+@contextmanager
+def _immediate_transaction(conn):
+    """Run the block in BEGIN IMMEDIATE ... COMMIT on conn, yielding a cursor.
+
+    The startup setup writes on the calling thread's pooled connection, so
+    a failure must roll back rather than leave it holding the write lock.
+    """
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        yield conn.cursor()
+    except BaseException:
+        conn.rollback()
+        raise
+    conn.commit()
+
 def init_db():
     """Initialize database tables"""
     conn = get_conn()
-    c = conn.cursor()
+    # WAL lets readers run alongside a writer. The journal mode is stored
+    # in the database file, so it only needs to be set once here.
+    try:
+        conn.execute("PRAGMA journal_mode = WAL;")
+    except sqlite3.OperationalError:
+        pass
+    # Create all tables in one transaction instead of one commit per DDL.
+    # Take the write lock up front: the setup below reads the schema before
+    # writing, and under WAL a deferred transaction whose read-to-write
+    # upgrade races another process (e.g. gunicorn workers booting
+    # together) fails with "database is locked" without waiting.
+    with _immediate_transaction(conn) as c:
+        # Create categories table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS categories (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL UNIQUE
+            )
+        """)
     
-    # Create categories table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS categories (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL UNIQUE
-        )
-    """)
+        # Create authors table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS authors (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL
+            )
+        """)
     
-    # Create authors table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS authors (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL
-        )
-    """)
+        # Create publishers table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS publishers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL
+            )
+        """)
     
-    # Create publishers table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS publishers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL
-        )
-    """)
+        # Create books table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS books (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                title TEXT NOT NULL,
+                isbn TEXT UNIQUE,
+                category_id INTEGER,
+                author_name TEXT,
+                publisher_name TEXT,
+                quantity INTEGER DEFAULT 1,
+                available INTEGER DEFAULT 1,
+                added_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                author_id INTEGER REFERENCES authors(id),
+                publisher_id INTEGER REFERENCES publishers(id),
+                FOREIGN KEY (category_id) REFERENCES categories(id)
+            )
+        """)
+        _migrate_book_name_links(c)
     
-    # Create books table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS books (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            title TEXT NOT NULL,
-            isbn TEXT UNIQUE,
-            category_id INTEGER,
-            author_name TEXT,
-            publisher_name TEXT,
-            quantity INTEGER DEFAULT 1,
-            available INTEGER DEFAULT 1,
-            added_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            FOREIGN KEY (category_id) REFERENCES categories(id)
-        )
-    """)
+        # Create borrowers table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS borrowers (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                name TEXT NOT NULL,
+                email TEXT UNIQUE,
+                phone TEXT,
+                joined_date TEXT DEFAULT CURRENT_TIMESTAMP
+            )
+        """)
     
-    # Create borrowers table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS borrowers (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            name TEXT NOT NULL,
-            email TEXT UNIQUE,
-            phone TEXT,
-            joined_date TEXT DEFAULT CURRENT_TIMESTAMP
-        )
-    """)
+        # Create loans table
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS loans (
+                id INTEGER PRIMARY KEY AUTOINCREMENT,
+                book_id INTEGER NOT NULL,
+                borrower_id INTEGER NOT NULL,
+                loan_date TEXT DEFAULT CURRENT_TIMESTAMP,
+                due_date TEXT,
+                return_date TEXT,
+                status TEXT DEFAULT 'active',
+                FOREIGN KEY (book_id) REFERENCES books(id),
+                FOREIGN KEY (borrower_id) REFERENCES borrowers(id)
+            )
+        """)
     
-    # Create loans table
-    c.execute("""
-        CREATE TABLE IF NOT EXISTS loans (
-            id INTEGER PRIMARY KEY AUTOINCREMENT,
-            book_id INTEGER NOT NULL,
-            borrower_id INTEGER NOT NULL,
-            loan_date TEXT DEFAULT CURRENT_TIMESTAMP,
-            due_date TEXT,
-            return_date TEXT,
-            status TEXT DEFAULT 'active',
-            FOREIGN KEY (book_id) REFERENCES books(id),
-            FOREIGN KEY (borrower_id) REFERENCES borrowers(id)
-        )
+        # Create table_versions table: a write counter per table, bumped by
+        # triggers on every INSERT/UPDATE/DELETE so any process (or script)
+        # writing to the DB is seen. Used to tell whether cached pages are stale.
+        c.execute("""
+            CREATE TABLE IF NOT EXISTS table_versions (
+                name TEXT PRIMARY KEY,
+                version INTEGER NOT NULL DEFAULT 0
+            )
+        """)
+        for table in VERSIONED_TABLES:
+            c.execute("INSERT OR IGNORE INTO table_versions (name) VALUES (?)", (table,))
+            for op in ('INSERT', 'UPDATE', 'DELETE'):
+                c.execute(f"""
+                    CREATE TRIGGER IF NOT EXISTS trg_{table}_{op.lower()}_version
+                    AFTER {op} ON {table}
+                    BEGIN
+                        UPDATE table_versions SET version = version + 1 WHERE name = '{table}';
+                    END
+                """)
+
+        # 'book_links' only moves when a book is added, removed or re-linked to
+        # another category/author/publisher. Those lists show per-name book
+        # counts, so loans and returns (which only touch books.available) must
+        # not invalidate them.
+        # update_book always writes all three link columns, so the UPDATE
+        # trigger also checks that one of them actually changed.
+        c.execute("INSERT OR IGNORE INTO table_versions (name) VALUES ('book_links')")
+        # Replaced by trg_books_relinked_links_version (no WHEN clause)
+        c.execute("DROP TRIGGER IF EXISTS trg_books_relink_links_version")
+        relinked = ("UPDATE OF category_id, author_id, publisher_id ON books WHEN "
+                    "OLD.category_id IS NOT NEW.category_id OR "
+                    "OLD.author_id IS NOT NEW.author_id OR "
+                    "OLD.publisher_id IS NOT NEW.publisher_id")
+        for name, event in (('insert', 'INSERT ON books'), ('delete', 'DELETE ON books'),
+                            ('relinked', relinked)):
+            c.execute(f"""
+                CREATE TRIGGER IF NOT EXISTS trg_books_{name}_links_version
+                AFTER {event}
+                BEGIN
+                    UPDATE table_versions SET version = version + 1 WHERE name = 'book_links';
+                END
+            """)
+
+        _create_books_fts(c)
+
+
+# Full-text index over the searchable book columns. It is an external
+# content table (the text lives only in `books`), kept in sync by triggers.
+# The trigram tokenizer matches arbitrary substrings like LIKE '%q%' did,
+# but needs at least 3 characters; shorter searches fall back to LIKE.
+# Set by init_db() when the SQLite build supports it.
+BOOKS_FTS_AVAILABLE = False
+FTS_MIN_QUERY_LENGTH = 3
+_BOOK_SEARCH_COLUMNS = ('title', 'author_name', 'publisher_name', 'isbn')
+
+# Books link to their author and publisher by id. The names stay on the
+# row as well, since that is what the lists display and search matches;
+# renaming an author or publisher rewrites them.
+_BOOK_NAME_LINKS = (('author_id', 'author_name', 'authors'),
+                    ('publisher_id', 'publisher_name', 'publishers'))
+
+def _migrate_book_name_links(c):
+    """Add the id columns to older databases and fill in missing links."""
+    columns = {r[1] for r in c.execute("PRAGMA table_info(books)")}
+    for id_col, name_col, table in _BOOK_NAME_LINKS:
+        if id_col not in columns:
+            c.execute(f"ALTER TABLE books ADD COLUMN {id_col} INTEGER REFERENCES {table}(id)")
+        # Also picks up books written without models (e.g. scripts inserting
+        # directly): create missing names, then link to the oldest match.
+        c.execute(f"""
+            INSERT INTO {table} (name)
+            SELECT DISTINCT b.{name_col} FROM books b
+            WHERE b.{id_col} IS NULL AND b.{name_col} IS NOT NULL
+              AND NOT EXISTS (SELECT 1 FROM {table} t WHERE t.name = b.{name_col})
+        """)
+        c.execute(f"""
+            UPDATE books SET {id_col} = (SELECT MIN(t.id) FROM {table} t WHERE t.name = books.{name_col})
+            WHERE {id_col} IS NULL AND {name_col} IS NOT NULL
+        """)
+
+def _name_id(c, table, name):
+    """Id of the (oldest) row in authors/publishers with this name, created if missing."""
+    if not name:
+        return None
+    row = c.execute(f"SELECT id FROM {table} WHERE name = ? ORDER BY id LIMIT 1", (name,)).fetchone()
+    if row is not None:
+        return row[0]
+    c.execute(f"INSERT INTO {table} (name) VALUES (?)", (name,))
+    return c.lastrowid
+
+def _create_books_fts(c):
+    global BOOKS_FTS_AVAILABLE
+    columns = ', '.join(_BOOK_SEARCH_COLUMNS)
+    new_values = ', '.join(f'new.{col}' for col in _BOOK_SEARCH_COLUMNS)
+    old_values = ', '.join(f'old.{col}' for col in _BOOK_SEARCH_COLUMNS)
+    exists = c.execute(
+        "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'books_fts'"
+    ).fetchone()
+    try:
+        c.execute(f"""
+            CREATE VIRTUAL TABLE IF NOT EXISTS books_fts USING fts5(
+                {columns}, content='books', content_rowid='id', tokenize='trigram'
+            )
+        """)
+    except sqlite3.OperationalError:
+        # SQLite built without FTS5 or older than 3.34 (no trigram tokenizer)
+        BOOKS_FTS_AVAILABLE = False
+        return
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_books_fts_insert AFTER INSERT ON books
+        BEGIN
+            INSERT INTO books_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
     """)
-    
-    conn.commit()
-    conn.close()
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_books_fts_delete AFTER DELETE ON books
+        BEGIN
+            INSERT INTO books_fts (books_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+        END
+    """)
+    # Only re-index when searchable text changes, not on every availability update
+    c.execute(f"""
+        CREATE TRIGGER IF NOT EXISTS trg_books_fts_update AFTER UPDATE OF {columns} ON books
+        BEGIN
+            INSERT INTO books_fts (books_fts, rowid, {columns}) VALUES ('delete', old.id, {old_values});
+            INSERT INTO books_fts (rowid, {columns}) VALUES (new.id, {new_values});
+        END
+    """)
+    if not exists:
+        # Index books that were added before the FTS table existed
+        c.execute("INSERT INTO books_fts (books_fts) VALUES ('rebuild')")
+    BOOKS_FTS_AVAILABLE = True
+
+# WHERE clauses restricting `books b` to rows matching a search, by kind
+_BOOK_SEARCH_SQL = {
+    None: "",
+    'fts': " AND b.id IN (SELECT rowid FROM books_fts WHERE books_fts MATCH ?)",
+    'like': " AND (" + ' OR '.join(f'b.{col} LIKE ?' for col in _BOOK_SEARCH_COLUMNS) + ")",
+}
+
+def _book_search(search):
+    """Return (kind, params) for the _BOOK_SEARCH_SQL clause matching search."""
+    if not search:
+        return None, ()
+    if BOOKS_FTS_AVAILABLE and len(search) >= FTS_MIN_QUERY_LENGTH:
+        # Quote as a single phrase so user input is not parsed as FTS syntax
+        return 'fts', ('"' + search.replace('"', '""') + '"',)
+    return 'like', (f'%{search}%',) * len(_BOOK_SEARCH_COLUMNS)
+
+
+class ModelError(Exception):
+    """A database operation in the model layer failed."""
+
+class IntegrityError(ModelError):
+    """A write was rejected by a constraint (unique, foreign key, not null)."""
+
+def read_op(fn):
+    """Re-raise sqlite3 errors from the decorated read as ModelError.
+
+    The read-side counterpart of write_op's error translation, so callers
+    handle failed lookups the same way as failed writes.
+    """
+    @functools.wraps(fn)
+    def wrapper(*args, **kwargs):
+        try:
+            return fn(*args, **kwargs)
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        except sqlite3.Error as e:
+            raise ModelError(str(e)) from e
+    return wrapper
+
+
+# ------------- WRITES -------------
+# SQLite allows a single writer at a time. Rather than having request
+# threads race for the write lock and retry on "database is locked", every
+# write runs on one writer thread that owns the write connection. Writes
+# that queue up while a batch is running are committed together in one
+# transaction (one WAL sync), each inside its own SAVEPOINT so a failing
+# write only undoes itself. Waiting on other processes holding the lock is
+# left to the connection's busy timeout.
+_write_queue = queue.Queue()
+_WRITE_BATCH_MAX = 64
+_writer_thread = None
+_writer_start_lock = threading.Lock()
+
+def _run_in_savepoint(conn, fn, args, kwargs):
+    """Run one write in its own SAVEPOINT; return (result, error)."""
+    conn.execute("SAVEPOINT write_op")
+    try:
+        result = fn(conn.cursor(), *args, **kwargs)
+    except Exception as e:
+        conn.execute("ROLLBACK TO write_op")
+        conn.execute("RELEASE write_op")
+        return None, e
+    conn.execute("RELEASE write_op")
+    return result, None
+
+def _run_write_batch(conn, batch):
+    """Run queued writes in one transaction and resolve their futures."""
+    results = []
+    try:
+        # Take the write lock up front; a deferred transaction that has to
+        # upgrade from read to write can fail with SQLITE_BUSY immediately.
+        conn.execute("BEGIN IMMEDIATE")
+        for fn, args, kwargs, cache_prefixes, future in batch:
+            result, error = _run_in_savepoint(conn, fn, args, kwargs)
+            results.append((future, result, error))
+        conn.commit()
+    except sqlite3.Error as e:
+        # BEGIN or COMMIT failed, so none of the batch was written
+        if conn.in_transaction:
+            conn.rollback()
+        results = [(job[-1], None, e) for job in batch]
+
+    # Drop stale cache entries before any caller sees its write complete
+    for prefix in {p for job in batch for p in job[3]}:
+        _cache_clear(prefix)
+    for future, result, error in results:
+        if error is None:
+            future.set_result(result)
+        else:
+            future.set_exception(error)
+
+def _writer_loop():
+    conn = None
+    conn_db = None
+    held = None
+    while True:
+        first = held if held is not None else _write_queue.get()
+        held = None
+        db = first[0]
+        batch = [first[1:]]
+        # Batch whatever else is already waiting for the same database
+        while len(batch) < _WRITE_BATCH_MAX:
+            try:
+                job = _write_queue.get_nowait()
+            except queue.Empty:
+                break
+            if job[0] != db:
+                held = job
+                break
+            batch.append(job[1:])
+        try:
+            # Reopen if DB was pointed at a different file (e.g. by the tests)
+            if conn is None or conn_db != db:
+                if conn is not None:
+                    conn.close()
+                    conn = None
+                conn = _connect(db)
+                conn_db = db
+            _run_write_batch(conn, batch)
+        except Exception as e:
+            # e.g. the database file cannot be opened. Fail whatever is still
+            # pending (nobody else would resolve it) and keep serving writes.
+            for job in batch:
+                if not job[-1].done():
+                    job[-1].set_exception(e)
+            if conn is not None and conn.in_transaction:
+                try:
+                    conn.rollback()
+                except sqlite3.Error:
+                    pass
 
+def _start_writer():
+    global _writer_thread
+    with _writer_start_lock:
+        if _writer_thread is None or not _writer_thread.is_alive():
+            _writer_thread = threading.Thread(target=_writer_loop, name='db-writer', daemon=True)
+            _writer_thread.start()
 
-# Retry decorator for write operations to reduce chance of transient
-# sqlite "database is locked" OperationalError bubbling up to the app.
-def retry_db(max_attempts=5, initial_delay=0.05, backoff=2.0):
+def write_op(*cache_prefixes):
+    """Run the decorated write on the writer thread.
+
+    The function gets the writer's cursor as its first argument (callers
+    leave it out). The call blocks until the write has committed and
+    returns its result; sqlite3 errors are re-raised as ModelError or
+    IntegrityError so callers do not need to know about sqlite3.
+    ``cache_prefixes`` name the _CACHE entries to drop once committed.
+    """
     def decorator(fn):
         @functools.wraps(fn)
         def wrapper(*args, **kwargs):
-            delay = initial_delay
-            for attempt in range(1, max_attempts + 1):
-                try:
-                    return fn(*args, **kwargs)
-                except sqlite3.OperationalError as e:
-                    # Retry on database locked or busy errors
-                    msg = str(e).lower()
-                    if 'locked' in msg or 'database is locked' in msg or 'busy' in msg:
-                        if attempt == max_attempts:
-                            raise
-                        time.sleep(delay)
-                        delay *= backoff
-                        continue
-                    raise
+            future = Future()
+            txn = getattr(_local, 'txn', None)
+            if txn is not None:
+                txn.jobs.put((fn, args, kwargs, cache_prefixes, future))
+                # If the block's job died, its error stands in for this one
+                wait([future, txn.done], return_when=FIRST_COMPLETED)
+                if not future.done():
+                    future = txn.done
+            else:
+                _start_writer()
+                _write_queue.put((DB, fn, args, kwargs, cache_prefixes, future))
+            try:
+                return future.result()
+            except sqlite3.IntegrityError as e:
+                raise IntegrityError(str(e)) from e
+            except sqlite3.Error as e:
+                raise ModelError(str(e)) from e
         return wrapper
     return decorator
 
-@retry_db()
-def seed_default_categories():
+class _Rollback(Exception):
+    """Tells a _Transaction on the writer thread to undo its writes."""
+
+class _Transaction:
+    """Writes made inside one transaction() block.
+
+    Runs on the writer thread as a single write job: it feeds the block's
+    writes through one at a time as the calling thread makes them, so they
+    commit together (or not at all) with the rest of the batch.
+    """
+
+    def __init__(self):
+        self.jobs = queue.Queue()
+        self.started = Future()
+        self.done = Future()
+        # Filled in as writes arrive; the batch clears these after COMMIT
+        self.cache_prefixes = set()
+
+    def __call__(self, c):
+        conn = c.connection
+        self.started.set_result(None)
+        while True:
+            job = self.jobs.get()
+            if job is None:
+                return
+            if isinstance(job, _Rollback):
+                raise job
+            fn, args, kwargs, cache_prefixes, future = job
+            self.cache_prefixes.update(cache_prefixes)
+            result, error = _run_in_savepoint(conn, fn, args, kwargs)
+            if error is None:
+                future.set_result(result)
+            else:
+                future.set_exception(error)
+
+@contextmanager
+def transaction():
+    """Group the writes made in the block into one all-or-nothing commit.
+
+    Each write still returns its result straight away (so later writes can
+    use an id from an earlier one) and a write that fails only undoes
+    itself; an exception leaving the block rolls back all of them. The
+    block holds the writer, so other writes wait until it ends; this
+    thread's reads do not see the block's writes until it has committed.
+    Nested blocks join the outer one.
+    """
+    if getattr(_local, 'txn', None) is not None:
+        yield
+        return
+    _start_writer()
+    txn = _Transaction()
+    future = txn.done
+    _write_queue.put((DB, txn, (), {}, txn.cache_prefixes, future))
+    # Wait for the writer to start the block; if the batch it joined could
+    # not begin, the error arrives on future instead.
+    wait([txn.started, future], return_when=FIRST_COMPLETED)
+    if not txn.started.done():
+        try:
+            future.result()
+        except sqlite3.Error as e:
+            raise ModelError(str(e)) from e
+    _local.txn = txn
+    try:
+        yield
+    except BaseException:
+        txn.jobs.put(_Rollback())
+        # The rollback's outcome is of no interest; re-raise the original
+        wait([future])
+        raise
+    else:
+        txn.jobs.put(None)
+        try:
+            future.result()
+        except sqlite3.IntegrityError as e:
+            raise IntegrityError(str(e)) from e
+        except sqlite3.Error as e:
+            raise ModelError(str(e)) from e
+    finally:
+        _local.txn = None
+
+@write_op('categories')
+def seed_default_categories(c):
     """Insert default categories if table is empty"""
-    conn = get_conn()
-    c = conn.cursor()
-    
     count = c.execute("SELECT COUNT(*) FROM categories").fetchone()[0]
     
     if count == 0:
         default_categories = ['Fiction', 'Non-Fiction', 'Science', 'History', 'Biography']
-        for cat_name in default_categories:
-            c.execute("INSERT INTO categories (name) VALUES (?)", (cat_name,))
-        conn.commit()
-    
-    conn.close()
+        c.executemany("INSERT INTO categories (name) VALUES (?)", [(n,) for n in default_categories])
 
-# Simple in-memory TTL cache to reduce frequent identical reads
+# Simple in-memory cache to avoid re-running identical reads. Entries do
+# not expire with time: each one is stored with the table_versions of the
+# tables it was read from (taken before the query ran) and is only served
+# while those are unchanged, so writes from other processes invalidate it
+# too. write_op additionally drops entries for writes made here.
 _CACHE = {}
-_CACHE_TTL = 5  # seconds
+_CACHE_MAX = 512  # entries; distinct searches would otherwise pile up
 
-def _cache_get(key):
+def _cache_get(key, versions):
     entry = _CACHE.get(key)
     if not entry:
         return None
-    value, ts = entry
-    if time.time() - ts > _CACHE_TTL:
+    value, entry_versions = entry
+    if entry_versions != versions:
         _CACHE.pop(key, None)
         return None
     return value
 
-def _cache_set(key, value):
-    _CACHE[key] = (value, time.time())
+def _cache_set(key, value, versions):
+    if key not in _CACHE and len(_CACHE) >= _CACHE_MAX:
+        # Evict the oldest entry (dicts keep insertion order)
+        try:
+            _CACHE.pop(next(iter(_CACHE)), None)
+        except (StopIteration, RuntimeError):
+            pass
+    _CACHE[key] = (value, versions)
 
+# Keys are tuples whose first item names the cache group ('books',
+# 'stats', ...); write_op clears whole groups by that name.
 def _cache_clear(prefix=None):
     if prefix is None:
         _CACHE.clear()
     else:
         for k in list(_CACHE.keys()):
-            if k.startswith(prefix):
+            if k[0] == prefix:
                 _CACHE.pop(k, None)
 
+# Book writes change the book lists, the book counts shown on the
+# category/author/publisher lists and the dashboard totals
+_BOOK_CACHES = ('books', 'categories', 'authors', 'publishers', 'stats')
+
+@read_op
+def get_table_versions(*tables):
+    """Return the write counters for the given tables, in the same order."""
+    conn = get_conn()
+    placeholders = ', '.join('?' * len(tables))
+    rows = conn.execute(
+        f"SELECT name, version FROM table_versions WHERE name IN ({placeholders})", tables
+    ).fetchall()
+    versions = {r['name']: r['version'] for r in rows}
+    return tuple(versions.get(t, 0) for t in tables)
+
 def ensure_db_indexes():
     """Create commonly-used indexes to speed up queries (idempotent)."""
     conn = get_conn()
-    c = conn.cursor()
-    # Indexes to speed up joins and lookups for loans and books
-    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_book_id ON loans (book_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_loans_borrower_id ON loans (borrower_id)")
-    c.execute("CREATE INDEX IF NOT EXISTS idx_books_category_id ON books (category_id)")
-    # The schema stores author and publisher names on the books table
-    # (author_name / publisher_name). Attempt to create indexes on those
-    # columns and ignore failures if the column is missing for older DBs.
-    try:
-        c.execute("CREATE INDEX IF NOT EXISTS idx_books_author_name ON books (author_name)")
-    except sqlite3.OperationalError:
-        pass
-    try:
-        c.execute("CREATE INDEX IF NOT EXISTS idx_books_publisher_name ON books (publisher_name)")
-    except sqlite3.OperationalError:
-        pass
-    conn.commit()
-    conn.close()
+    # sqlite3 autocommits DDL, so without an explicit transaction every
+    # CREATE INDEX would commit (and sync) separately. A failing statement
+    # below only undoes itself, not the surrounding transaction. IMMEDIATE
+    # so concurrent startups wait on the busy timeout (see init_db).
+    with _immediate_transaction(conn) as c:
+        # Indexes to speed up joins and lookups for loans and books
+        c.execute("CREATE INDEX IF NOT EXISTS idx_loans_book_id ON loans (book_id)")
+        # (borrower_id, status) serves both per-borrower loan counts from the
+        # index alone; it also covers plain borrower_id lookups, which makes
+        # the older single-column index redundant.
+        c.execute("CREATE INDEX IF NOT EXISTS idx_loans_borrower_status ON loans (borrower_id, status)")
+        c.execute("DROP INDEX IF EXISTS idx_loans_borrower_id")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_books_category_id ON books (category_id)")
+        # (status, due_date) lets the overdue filter seek straight to the active
+        # loans due before now; it replaces the single-column due_date index.
+        c.execute("CREATE INDEX IF NOT EXISTS idx_loans_status_due ON loans (status, due_date)")
+        c.execute("DROP INDEX IF EXISTS idx_loans_due_date")
+        # Partial index over lendable books, ordered by title for the loan form
+        c.execute("CREATE INDEX IF NOT EXISTS idx_books_available_title ON books (title) WHERE available > 0")
+        # Books reference authors/publishers by id (see _BOOK_NAME_LINKS). Index
+        # the ids for the book counts and the name lookup done on book writes.
+        # Ignore failures if the column is missing for older DBs.
+        try:
+            c.execute("CREATE INDEX IF NOT EXISTS idx_books_author_id ON books (author_id)")
+            c.execute("CREATE INDEX IF NOT EXISTS idx_books_publisher_id ON books (publisher_id)")
+        except sqlite3.OperationalError:
+            pass
+        c.execute("CREATE INDEX IF NOT EXISTS idx_authors_name ON authors (name)")
+        c.execute("CREATE INDEX IF NOT EXISTS idx_publishers_name ON publishers (name)")
+        # Name-based indexes from before the id columns; nothing queries by
+        # author_name/publisher_name anymore (search goes through books_fts).
+        c.execute("DROP INDEX IF EXISTS idx_books_author_name")
+        c.execute("DROP INDEX IF EXISTS idx_books_publisher_name")
 
 # ------------- CATEGORIES -------------
+@read_op
 def get_all_categories():
     """Get all categories with book count"""
+    cache_key = ('categories', 'all')
+    versions = get_table_versions('categories', 'book_links')
+    cached = _cache_get(cache_key, versions)
+    if cached is not None:
+        return cached
+
     conn = get_conn()
     rows = conn.execute("""
-        SELECT c.id, c.name, COUNT(b.id) as book_count
+        SELECT c.id, c.name,
+               (SELECT COUNT(*) FROM books b WHERE b.category_id = c.id) as book_count
         FROM categories c
-        LEFT JOIN books b ON c.id = b.category_id
-        GROUP BY c.id, c.name
         ORDER BY c.name
     """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    _cache_set(cache_key, rows, versions)
+    return rows
 
+@read_op
 def get_category_by_id(category_id):
     """Get category by ID"""
     conn = get_conn()
     row = conn.execute("SELECT * FROM categories WHERE id = ?", (category_id,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
-@retry_db()
-def add_category(name):
+@write_op('categories')
+def add_category(c, name):
     """Add new category"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("INSERT INTO categories (name) VALUES (?)", (name,))
-    conn.commit()
-    category_id = c.lastrowid
-    conn.close()
-    return category_id
+    return c.lastrowid
 
-@retry_db()
-def update_category(category_id, name):
+# Also invalidates book lists (they show the category name)
+@write_op('categories', 'books')
+def update_category(c, category_id, name):
     """Update category"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("UPDATE categories SET name = ? WHERE id = ?", (name, category_id))
-    conn.commit()
-    conn.close()
 
-@retry_db()
-def delete_category(category_id):
+@write_op('categories', 'books')
+def delete_category(c, category_id):
     """Delete category"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("DELETE FROM categories WHERE id = ?", (category_id,))
-    conn.commit()
-    conn.close()
 
 # ------------- AUTHORS -------------
+@read_op
 def get_all_authors():
     """Get all authors with book count"""
+    cache_key = ('authors', 'all')
+    versions = get_table_versions('authors', 'book_links')
+    cached = _cache_get(cache_key, versions)
+    if cached is not None:
+        return cached
+
     conn = get_conn()
     rows = conn.execute("""
-        SELECT a.id, a.name, COUNT(b.id) as book_count
+        SELECT a.id, a.name,
+               (SELECT COUNT(*) FROM books b WHERE b.author_id = a.id) as book_count
         FROM authors a
-        LEFT JOIN books b ON a.name = b.author_name
-        GROUP BY a.id, a.name
         ORDER BY a.name
     """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    _cache_set(cache_key, rows, versions)
+    return rows
 
+@read_op
 def get_author_by_id(author_id):
     """Get author by ID"""
     conn = get_conn()
     row = conn.execute("SELECT * FROM authors WHERE id = ?", (author_id,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
-@retry_db()
-def add_author(name):
+@write_op('authors')
+def add_author(c, name):
     """Add new author"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("INSERT INTO authors (name) VALUES (?)", (name,))
-    conn.commit()
-    author_id = c.lastrowid
-    conn.close()
-    return author_id
+    return c.lastrowid
 
-@retry_db()
-def update_author(author_id, name):
-    """Update author"""
-    conn = get_conn()
-    c = conn.cursor()
+# Also invalidates book lists (they show the author name)
+@write_op('authors', 'books')
+def update_author(c, author_id, name):
+    """Update author and the name shown on its books"""
     c.execute("UPDATE authors SET name = ? WHERE id = ?", (name, author_id))
-    conn.commit()
-    conn.close()
+    c.execute("UPDATE books SET author_name = ? WHERE author_id = ?", (name, author_id))
 
-@retry_db()
-def delete_author(author_id):
+@write_op('authors')
+def delete_author(c, author_id):
     """Delete author"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("DELETE FROM authors WHERE id = ?", (author_id,))
-    conn.commit()
-    conn.close()
 
 # ------------- PUBLISHERS -------------
+@read_op
 def get_all_publishers():
     """Get all publishers with book count"""
+    cache_key = ('publishers', 'all')
+    versions = get_table_versions('publishers', 'book_links')
+    cached = _cache_get(cache_key, versions)
+    if cached is not None:
+        return cached
+
     conn = get_conn()
     rows = conn.execute("""
-        SELECT p.id, p.name, COUNT(b.id) as book_count
+        SELECT p.id, p.name,
+               (SELECT COUNT(*) FROM books b WHERE b.publisher_id = p.id) as book_count
         FROM publishers p
-        LEFT JOIN books b ON p.name = b.publisher_name
-        GROUP BY p.id, p.name
         ORDER BY p.name
     """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    _cache_set(cache_key, rows, versions)
+    return rows
 
+@read_op
 def get_publisher_by_id(publisher_id):
     """Get publisher by ID"""
     conn = get_conn()
     row = conn.execute("SELECT * FROM publishers WHERE id = ?", (publisher_id,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
-@retry_db()
-def add_publisher(name):
+@write_op('publishers')
+def add_publisher(c, name):
     """Add new publisher"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("INSERT INTO publishers (name) VALUES (?)", (name,))
-    conn.commit()
-    publisher_id = c.lastrowid
-    conn.close()
-    return publisher_id
+    return c.lastrowid
 
-@retry_db()
-def update_publisher(publisher_id, name):
-    """Update publisher"""
-    conn = get_conn()
-    c = conn.cursor()
+# Also invalidates book lists (they show the publisher name)
+@write_op('publishers', 'books')
+def update_publisher(c, publisher_id, name):
+    """Update publisher and the name shown on its books"""
     c.execute("UPDATE publishers SET name = ? WHERE id = ?", (name, publisher_id))
-    conn.commit()
-    conn.close()
+    c.execute("UPDATE books SET publisher_name = ? WHERE publisher_id = ?", (name, publisher_id))
 
-@retry_db()
-def delete_publisher(publisher_id):
+@write_op('publishers')
+def delete_publisher(c, publisher_id):
     """Delete publisher"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("DELETE FROM publishers WHERE id = ?", (publisher_id,))
-    conn.commit()
-    conn.close()
 
 # ------------- BOOKS -------------
+def _book_list_sql(columns, where):
+    """Build the book list statement for every (search kind, by category) shape."""
+    return {
+        (kind, by_category): f"""
+            SELECT {columns}
+            FROM books b
+            LEFT JOIN categories c ON b.category_id = c.id
+            WHERE {where}{search_sql}{" AND b.category_id = ?" if by_category else ""}
+            ORDER BY b.title
+        """
+        for kind, search_sql in _BOOK_SEARCH_SQL.items()
+        for by_category in (False, True)
+    }
+
+# Lists select only the columns their pages show; get_book_by_id keeps b.*
+_SQL_ALL_BOOKS = _book_list_sql(
+    "b.id, b.title, b.isbn, b.author_name, b.publisher_name, b.quantity, b.available, "
+    "c.name as category_name",
+    "1=1",
+)
+# Feeds the book picker on the new-loan form
+_SQL_AVAILABLE_BOOKS = _book_list_sql("b.id, b.title, b.available", "b.available > 0")
+
+def _query_books(statements, search, category_id):
+    kind, params = _book_search(search)
+    if category_id:
+        params += (category_id,)
+    return get_conn().execute(statements[kind, bool(category_id)], params).fetchall()
+
+@read_op
 def get_all_books(search='', category_filter=''):
     """Get all books with optional filters"""
     # Use a small cache to reduce frequent identical queries
-    cache_key = f"books:{search}:{category_filter}"
-    cached = _cache_get(cache_key)
+    cache_key = ('books', search, category_filter)
+    versions = get_table_versions('books', 'categories')
+    cached = _cache_get(cache_key, versions)
     if cached is not None:
         return cached
 
-    conn = get_conn()
-    
-    query = """
-        SELECT b.*, c.name as category_name
-        FROM books b
-        LEFT JOIN categories c ON b.category_id = c.id
-        WHERE 1=1
-    """
-    params = []
-    
-    if search:
-        query += " AND b.title LIKE ?"
-        params.append(f'%{search}%')
-    
-    if category_filter:
-        query += " AND b.category_id = ?"
-        params.append(category_filter)
-    
-    query += " ORDER BY b.title"
-    
-    rows = conn.execute(query, params).fetchall()
-    conn.close()
-    result = [dict(r) for r in rows]
-    _cache_set(cache_key, result)
+    result = _query_books(_SQL_ALL_BOOKS, search, category_filter)
+    _cache_set(cache_key, result, versions)
+    return result
+
+@read_op
+def get_available_books(search='', category_id=None):
+    """Get books with at least one copy available, with optional filters"""
+    cache_key = ('books', 'available', search, category_id)
+    versions = get_table_versions('books', 'categories')
+    cached = _cache_get(cache_key, versions)
+    if cached is not None:
+        return cached
+
+    result = _query_books(_SQL_AVAILABLE_BOOKS, search, category_id)
+    _cache_set(cache_key, result, versions)
     return result
 
+_SQL_GET_BOOK = """
+    SELECT b.*, c.name as category_name
+    FROM books b
+    LEFT JOIN categories c ON b.category_id = c.id
+    WHERE b.id = ?
+"""
+
+@read_op
 def get_book_by_id(book_id):
     """Get book by ID"""
     conn = get_conn()
-    row = conn.execute("""
-        SELECT b.*, c.name as category_name
-        FROM books b
-        LEFT JOIN categories c ON b.category_id = c.id
-        WHERE b.id = ?
-    """, (book_id,)).fetchone()
-    conn.close()
+    row = conn.execute(_SQL_GET_BOOK, (book_id,)).fetchone()
     return dict(row) if row else None
 
-def get_total_books():
-    """Get total number of books"""
+@read_op
+def category_has_books(category_id):
+    """Return True if any book is filed under the given category."""
     conn = get_conn()
-    count = conn.execute("SELECT COUNT(*) FROM books").fetchone()[0]
-    conn.close()
-    return count
+    exists = conn.execute(
+        "SELECT EXISTS(SELECT 1 FROM books WHERE category_id = ?)", (category_id,)
+    ).fetchone()[0]
+    return bool(exists)
 
-def get_total_available_books():
-    """Get total available books"""
+@read_op
+def book_exists_for_author(author_id):
+    """Return True if any book references the given author."""
     conn = get_conn()
-    total = conn.execute("SELECT COALESCE(SUM(available), 0) FROM books").fetchone()[0]
-    conn.close()
-    return total
+    exists = conn.execute(
+        "SELECT EXISTS(SELECT 1 FROM books WHERE author_id = ?)", (author_id,)
+    ).fetchone()[0]
+    return bool(exists)
 
-@retry_db()
-def add_book(title, isbn, category_id, author_name, publisher_name, quantity):
-    """Add new book"""
-    conn = get_conn()
-    c = conn.cursor()
-    c.execute("""
-        INSERT INTO books (title, isbn, category_id, author_name, publisher_name, quantity, available)
-        VALUES (?, ?, ?, ?, ?, ?, ?)
-    """, (title, isbn, category_id, author_name, publisher_name, quantity, quantity))
-    conn.commit()
-    book_id = c.lastrowid
-    conn.close()
-    # Invalidate books cache
-    _cache_clear('books')
-    return book_id
-
-@retry_db()
-def update_book(book_id, title, isbn, category_id, author_name, publisher_name, quantity):
-    """Update book"""
+@read_op
+def book_exists_for_publisher(publisher_id):
+    """Return True if any book references the given publisher."""
     conn = get_conn()
-    c = conn.cursor()
-    
-    # Get active loans count
-    active_loans = c.execute(
-        "SELECT COUNT(*) FROM loans WHERE book_id = ? AND status = 'active'",
-        (book_id,)
+    exists = conn.execute(
+        "SELECT EXISTS(SELECT 1 FROM books WHERE publisher_id = ?)", (publisher_id,)
     ).fetchone()[0]
-    
-    # Calculate available
-    available = quantity - active_loans
-    
+    return bool(exists)
+
+@write_op(*_BOOK_CACHES)
+def add_book(c, title, isbn, category_id, author_name, publisher_name, quantity):
+    """Add new book, creating its author/publisher if they do not exist yet"""
+    author_id = _name_id(c, 'authors', author_name)
+    publisher_id = _name_id(c, 'publishers', publisher_name)
     c.execute("""
-        UPDATE books 
-        SET title = ?, isbn = ?, category_id = ?, author_name = ?, publisher_name = ?, 
-            quantity = ?, available = ?
-        WHERE id = ?
-    """, (title, isbn, category_id, author_name, publisher_name, quantity, available, book_id))
-    conn.commit()
-    conn.close()
-    # Invalidate books cache
-    _cache_clear('books')
-    return active_loans
+        INSERT INTO books (title, isbn, category_id, author_name, publisher_name,
+                           author_id, publisher_id, quantity, available)
+        VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?)
+    """, (title, isbn, category_id, author_name, publisher_name,
+          author_id, publisher_id, quantity, quantity))
+    return c.lastrowid
 
-@retry_db()
-def delete_book(book_id):
+# One statement: available is derived from the active loan count, and the
+# guard refuses a quantity below it. RETURNING hands back that count
+# without a separate read (needs SQLite 3.35+).
+_SQL_ACTIVE_LOANS_OF_BOOK = "(SELECT COUNT(*) FROM loans WHERE book_id = books.id AND status = 'active')"
+_SQL_UPDATE_BOOK = f"""
+    UPDATE books 
+    SET title = ?, isbn = ?, category_id = ?, author_name = ?, publisher_name = ?, 
+        author_id = ?, publisher_id = ?, quantity = ?, available = ? - {_SQL_ACTIVE_LOANS_OF_BOOK}
+    WHERE id = ? AND ? >= {_SQL_ACTIVE_LOANS_OF_BOOK}
+    RETURNING quantity - available
+"""
+
+@write_op(*_BOOK_CACHES)
+def update_book(c, book_id, title, isbn, category_id, author_name, publisher_name, quantity):
+    """Update book, creating its author/publisher if they do not exist yet.
+
+    Returns the number of active loans. If that is more than the new
+    quantity the book is left unchanged.
+    """
+    # The author/publisher ids are needed in the UPDATE, so any new names
+    # are created first; undo them if the guard then refuses the edit.
+    c.execute("SAVEPOINT update_book")
+    author_id = _name_id(c, 'authors', author_name)
+    publisher_id = _name_id(c, 'publishers', publisher_name)
+
+    rows = c.execute(_SQL_UPDATE_BOOK, (
+        title, isbn, category_id, author_name, publisher_name,
+        author_id, publisher_id, quantity, quantity, book_id, quantity,
+    )).fetchall()
+    if rows:
+        c.execute("RELEASE update_book")
+        return rows[0][0]
+    c.execute("ROLLBACK TO update_book")
+    c.execute("RELEASE update_book")
+    # Refused (or no such book): report the count the quantity fell short of
+    return c.execute(
+        "SELECT COUNT(*) FROM loans WHERE book_id = ? AND status = 'active'", (book_id,)
+    ).fetchone()[0]
+
+@write_op(*_BOOK_CACHES)
+def delete_book(c, book_id):
     """Delete book"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("DELETE FROM books WHERE id = ?", (book_id,))
-    conn.commit()
-    conn.close()
-    # Invalidate books cache
-    _cache_clear('books')
 
 # ------------- BORROWERS -------------
+@read_op
 def get_all_borrowers():
     """Get all borrowers with active and total loan counts"""
-    cache_key = 'borrowers:all'
-    cached = _cache_get(cache_key)
+    cache_key = ('borrowers', 'all')
+    versions = get_table_versions('borrowers', 'loans')
+    cached = _cache_get(cache_key, versions)
     if cached is not None:
         return cached
 
     conn = get_conn()
+    # Per-borrower counts as correlated subqueries: each is a seek on
+    # idx_loans_borrower_status instead of grouping the whole join.
     rows = conn.execute("""
-        SELECT b.*, 
-               COUNT(CASE WHEN l.status = 'active' THEN 1 END) AS active_loans,
-               COUNT(l.id) AS total_loans
+        SELECT b.id, b.name, b.email, b.phone, b.joined_date,
+               (SELECT COUNT(*) FROM loans l
+                WHERE l.borrower_id = b.id AND l.status = 'active') AS active_loans,
+               (SELECT COUNT(*) FROM loans l WHERE l.borrower_id = b.id) AS total_loans
         FROM borrowers b
-        LEFT JOIN loans l ON b.id = l.borrower_id
-        GROUP BY b.id, b.name, b.email, b.phone, b.joined_date
         ORDER BY b.name
     """).fetchall()
-    conn.close()
-    # Ensure numeric fields exist even when NULL
-    result = []
-    for r in rows:
-        row = dict(r)
-        row.setdefault('active_loans', 0)
-        row.setdefault('total_loans', 0)
-        result.append(row)
-    _cache_set(cache_key, result)
-    return result
+    _cache_set(cache_key, rows, versions)
+    return rows
 
+@read_op
 def get_borrower_by_id(borrower_id):
     """Get borrower by ID"""
     conn = get_conn()
     row = conn.execute("SELECT * FROM borrowers WHERE id = ?", (borrower_id,)).fetchone()
-    conn.close()
     return dict(row) if row else None
 
-def get_total_borrowers():
-    """Get total number of borrowers"""
-    conn = get_conn()
-    count = conn.execute("SELECT COUNT(*) FROM borrowers").fetchone()[0]
-    conn.close()
-    return count
-
-@retry_db()
-def add_borrower(name, email, phone):
+@write_op('borrowers', 'stats')
+def add_borrower(c, name, email, phone):
     """Add new borrower"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("INSERT INTO borrowers (name, email, phone) VALUES (?, ?, ?)", (name, email, phone))
-    conn.commit()
-    borrower_id = c.lastrowid
-    conn.close()
-    # Invalidate borrowers cache
-    _cache_clear('borrowers')
-    return borrower_id
-
-@retry_db()
-def update_borrower(borrower_id, name, email, phone):
+    return c.lastrowid
+
+@write_op('borrowers')
+def update_borrower(c, borrower_id, name, email, phone):
     """Update borrower"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("""
         UPDATE borrowers SET name = ?, email = ?, phone = ? WHERE id = ?
     """, (name, email, phone, borrower_id))
-    conn.commit()
-    conn.close()
-    # Invalidate borrowers cache
-    _cache_clear('borrowers')
 
-@retry_db()
-def delete_borrower(borrower_id):
+@write_op('borrowers', 'stats')
+def delete_borrower(c, borrower_id):
     """Delete borrower"""
-    conn = get_conn()
-    c = conn.cursor()
     c.execute("DELETE FROM borrowers WHERE id = ?", (borrower_id,))
-    conn.commit()
-    conn.close()
-    # Invalidate borrowers cache
-    _cache_clear('borrowers')
 
 # ------------- LOANS -------------
-def get_all_loans():
-    """Get all loans with book and borrower details"""
+# Current UTC time as ISO-8601 text. Loan dates are written with it and the
+# overdue flag compares against it, so all date handling stays in SQLite.
+_SQL_NOW = "strftime('%Y-%m-%dT%H:%M:%f', 'now')"
+
+# SQL expression computing the overdue flag inline: only active loans can
+# be overdue and date-only due dates count as end-of-day. Due dates are
+# stored as ISO-8601 text, so comparing against "now" in the same format
+# is a plain string compare.
+_LOAN_OVERDUE_COND = f"""
+    (l.status = 'active' AND l.due_date IS NOT NULL AND
+     CASE WHEN length(l.due_date) = 10 THEN l.due_date || 'T23:59:59' ELSE l.due_date END
+         < {_SQL_NOW})
+"""
+_LOAN_OVERDUE_SQL = f"{_LOAN_OVERDUE_COND} AS is_overdue"
+
+# Filter selecting overdue loans. The CASE above hides due_date from the
+# index, so it is preceded by the looser range "due before now" (true of
+# every overdue loan), which SQLite answers with a seek on
+# idx_loans_status_due; the exact check then runs on those rows only.
+_LOAN_OVERDUE_WHERE = f"""
+    l.status = 'active' AND l.due_date < {_SQL_NOW} AND {_LOAN_OVERDUE_COND}
+"""
+
+# Loan statements that embed the expressions above are built once here,
+# not re-formatted on every call: the connection's statement cache is keyed
+# by the SQL text, and a fresh f-string has to be built and hashed each time.
+_SQL_LOANS_WITH_DETAILS = f"""
+    SELECT l.id, l.loan_date, l.due_date, l.return_date, l.status,
+           b.title as book_title, br.name as borrower_name, {_LOAN_OVERDUE_SQL}
+    FROM loans l
+    JOIN books b ON l.book_id = b.id
+    JOIN borrowers br ON l.borrower_id = br.id
+"""
+_SQL_ALL_LOANS = _SQL_LOANS_WITH_DETAILS + """
+    ORDER BY l.loan_date DESC
+"""
+_SQL_LOANS_BY_STATUS = _SQL_LOANS_WITH_DETAILS + """
+    WHERE l.status = ?
+    ORDER BY l.loan_date DESC
+"""
+_SQL_OVERDUE_LOANS = _SQL_LOANS_WITH_DETAILS + f"""
+    WHERE {_LOAN_OVERDUE_WHERE}
+    ORDER BY l.due_date
+"""
+_SQL_RECENT_ACTIVE_LOANS = _SQL_LOANS_WITH_DETAILS + """
+    WHERE l.status = 'active'
+    ORDER BY l.loan_date DESC
+    LIMIT 5
+"""
+_SQL_COUNT_OVERDUE_LOANS = f"""
+    SELECT COUNT(*) FROM loans l WHERE {_LOAN_OVERDUE_WHERE}
+"""
+_SQL_INSERT_LOAN = f"""
+    INSERT INTO loans (book_id, borrower_id, loan_date, due_date, status)
+    VALUES (?, ?, {_SQL_NOW}, strftime('%Y-%m-%dT%H:%M:%f', 'now', '+14 days'), 'active')
+"""
+_SQL_RETURN_LOAN = f"""
+    UPDATE loans SET status = 'returned', return_date = {_SQL_NOW} WHERE id = ?
+"""
+
+@read_op
+def get_all_loans(status=None):
+    """Get all loans with book and borrower details, optionally by status"""
     conn = get_conn()
-    rows = conn.execute("""
-        SELECT l.*, b.title as book_title, br.name as borrower_name
-        FROM loans l
-        JOIN books b ON l.book_id = b.id
-        JOIN borrowers br ON l.borrower_id = br.id
-        ORDER BY l.loan_date DESC
-    """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    if status:
+        return conn.execute(_SQL_LOANS_BY_STATUS, (status,)).fetchall()
+    rows = conn.execute(_SQL_ALL_LOANS).fetchall()
+    return rows
+
+@read_op
+def get_overdue_loans():
+    """Get overdue loans with book and borrower details, oldest due first"""
+    conn = get_conn()
+    rows = conn.execute(_SQL_OVERDUE_LOANS).fetchall()
+    return rows
 
+@read_op
 def get_active_loans():
     """Get recent active loans"""
     conn = get_conn()
-    rows = conn.execute("""
-        SELECT l.*, b.title as book_title, br.name as borrower_name
-        FROM loans l
-        JOIN books b ON l.book_id = b.id
-        JOIN borrowers br ON l.borrower_id = br.id
-        WHERE l.status = 'active'
-        ORDER BY l.loan_date DESC
-        LIMIT 5
-    """).fetchall()
-    conn.close()
-    return [dict(r) for r in rows]
+    rows = conn.execute(_SQL_RECENT_ACTIVE_LOANS).fetchall()
+    return rows
 
-def get_total_active_loans():
-    """Get total number of active loans"""
+@read_op
+def get_total_overdue_loans():
+    """Get total number of overdue loans"""
     conn = get_conn()
-    count = conn.execute("SELECT COUNT(*) FROM loans WHERE status = 'active'").fetchone()[0]
-    conn.close()
+    count = conn.execute(_SQL_COUNT_OVERDUE_LOANS).fetchone()[0]
     return count
 
+@read_op
+def get_dashboard_stats():
+    """Get the dashboard totals in one round trip.
+
+    Returns a dict with total_books, available_books, total_borrowers and
+    active_loans.
+    """
+    cache_key = ('stats', 'dashboard')
+    versions = get_table_versions('books', 'borrowers', 'loans')
+    cached = _cache_get(cache_key, versions)
+    if cached is not None:
+        return cached
+
+    conn = get_conn()
+    row = conn.execute("""
+        SELECT
+            (SELECT COUNT(*) FROM books) AS total_books,
+            (SELECT COALESCE(SUM(available), 0) FROM books) AS available_books,
+            (SELECT COUNT(*) FROM borrowers) AS total_borrowers,
+            (SELECT COUNT(*) FROM loans WHERE status = 'active') AS active_loans
+    """).fetchone()
+    result = dict(row)
+    _cache_set(cache_key, result, versions)
+    return result
+
+@read_op
 def get_loans_count_for_book(book_id):
     """Return the total number of loans (any status) for a specific book."""
     conn = get_conn()
-    try:
-        count = conn.execute("SELECT COUNT(*) FROM loans WHERE book_id = ?", (book_id,)).fetchone()[0]
-    finally:
-        conn.close()
+    count = conn.execute("SELECT COUNT(*) FROM loans WHERE book_id = ?", (book_id,)).fetchone()[0]
     return count
 
 
-def get_loans_count_for_borrower(borrower_id):
-    """Return the total number of loans (any status) for a specific borrower."""
+@read_op
+def get_loan_counts_for_borrower(borrower_id):
+    """Return (active, total) loan counts for a specific borrower."""
     conn = get_conn()
-    try:
-        count = conn.execute("SELECT COUNT(*) FROM loans WHERE borrower_id = ?", (borrower_id,)).fetchone()[0]
-    finally:
-        conn.close()
-    return count
+    # Both counts in one pass over the borrower's idx_loans_borrower_status entries
+    row = conn.execute("""
+        SELECT COUNT(CASE WHEN status = 'active' THEN 1 END), COUNT(*)
+        FROM loans WHERE borrower_id = ?
+    """, (borrower_id,)).fetchone()
+    return row[0], row[1]
 
+@read_op
 def get_active_loans_count_for_borrower(borrower_id):
     """Return the count of active loans for a specific borrower."""
     conn = get_conn()
-    try:
-        count = conn.execute("SELECT COUNT(*) FROM loans WHERE borrower_id = ? AND status = 'active'", (borrower_id,)).fetchone()[0]
-    finally:
-        conn.close()
+    count = conn.execute("SELECT COUNT(*) FROM loans WHERE borrower_id = ? AND status = 'active'", (borrower_id,)).fetchone()[0]
     return count
 
-@retry_db()
-def add_loan(book_id, borrower_id):
-    """Create new loan"""
-    conn = get_conn()
-    c = conn.cursor()
-    
-    loan_date = datetime.utcnow().isoformat()
-    due_date = (datetime.utcnow() + timedelta(days=14)).isoformat()
-    
-    c.execute("""
-        INSERT INTO loans (book_id, borrower_id, loan_date, due_date, status)
-        VALUES (?, ?, ?, ?, 'active')
-    """, (book_id, borrower_id, loan_date, due_date))
-    
-    # Update book availability
-    c.execute("UPDATE books SET available = available - 1 WHERE id = ?", (book_id,))
+# Invalidates books availability, borrower loan counts and dashboard totals
+@write_op('books', 'borrowers', 'stats')
+def add_loan(c, book_id, borrower_id):
+    """Create new loan.
+
+    Returns the new loan id, or None if the book has no available copies.
+    """
+    # Reserve a copy first; the guard makes the availability check and the
+    # decrement a single atomic step, so two concurrent loans cannot both
+    # take the last copy.
+    c.execute("UPDATE books SET available = available - 1 WHERE id = ? AND available > 0", (book_id,))
+    if c.rowcount == 0:
+        return None
     
-    conn.commit()
-    loan_id = c.lastrowid
-    conn.close()
-    # Invalidate affected caches: books availability and borrower loan counts
-    _cache_clear('books')
-    _cache_clear('borrowers')
-    return loan_id
-
-@retry_db()
-def return_loan(loan_id):
+    c.execute(_SQL_INSERT_LOAN, (book_id, borrower_id))
+    return c.lastrowid
+
+@write_op('books', 'borrowers', 'stats')
+def return_loan(c, loan_id):
     """Return a loaned book"""
-    conn = get_conn()
-    c = conn.cursor()
-    
     # Get book_id before updating
-    book_id = c.execute("SELECT book_id FROM loans WHERE id = ?", (loan_id,)).fetchone()[0]
+    row = c.execute("SELECT book_id FROM loans WHERE id = ?", (loan_id,)).fetchone()
+    if row is None:
+        raise ModelError(f'Loan {loan_id} does not exist')
+    book_id = row[0]
     
-    return_date = datetime.utcnow().isoformat()
-    c.execute("""
-        UPDATE loans SET status = 'returned', return_date = ? WHERE id = ?
-    """, (return_date, loan_id))
+    c.execute(_SQL_RETURN_LOAN, (loan_id,))
     
     # Update book availability
     c.execute("UPDATE books SET available = available + 1 WHERE id = ?", (book_id,))
-    
-    conn.commit()
-    conn.close()
-    # Invalidate affected caches
-    _cache_clear('books')
-    _cache_clear('borrowers')
-
-def is_loan_overdue(loan, now):
-    """
-    Check if a loan is overdue.
-    Handles both full ISO timestamps and date-only strings.
-    Date-only strings (YYYY-MM-DD) are treated as end-of-day.
-    """
-    if loan.get('status') != 'active' or not loan.get('due_date'):
-        return False
-    
-    try:
-        due_date_str = loan['due_date']
-        
-        # Check if date-only format (length 10, no 'T')
-        if len(due_date_str) == 10 and 'T' not in due_date_str:
-            # Treat as end of day: append 23:59:59
-            due_date_str += 'T23:59:59'
-        
-        due_date_obj = datetime.fromisoformat(due_date_str)
-        return due_date_obj < now
-    except (ValueError, TypeError, AttributeError):
-        # If parsing fails, assume not overdue to avoid false positives
-        return False
@@ -11,10 +11,19 @@ conn=sqlite3.connect(DB)
 c=conn.cursor()
 tables=[r[0] for r in c.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';").fetchall()]
 print('tables:', tables)
-for t in tables:
-    try:
-        cnt=c.execute(f"SELECT COUNT(*) FROM {t}").fetchone()[0]
-    except Exception as e:
-        cnt=f'ERR:{e}'
+# All counts in one query; if any table cannot be counted, fall back to
+# counting one by one so the others are still reported.
+try:
+    sql=" UNION ALL ".join(f"SELECT '{t}', COUNT(*) FROM \"{t}\"" for t in tables)
+    counts=c.execute(sql).fetchall() if tables else []
+except sqlite3.Error:
+    counts=[]
+    for t in tables:
+        try:
+            cnt=c.execute(f'SELECT COUNT(*) FROM "{t}"').fetchone()[0]
+        except Exception as e:
+            cnt=f'ERR:{e}'
+        counts.append((t, cnt))
+for t, cnt in counts:
     print(f"{t}: {cnt}")
 conn.close()
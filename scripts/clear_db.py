@@ -16,6 +16,12 @@ cursor = conn.cursor()
 
 # Discover user tables (exclude sqlite internal tables)
 tables = [r[0] for r in cursor.execute("SELECT name FROM sqlite_master WHERE type='table' AND name NOT LIKE 'sqlite_%';").fetchall()]
+# table_versions holds write counters used for HTTP ETags; resetting them
+# could make an old ETag match again, so it is left alone.
+tables = [t for t in tables if t != 'table_versions']
+# books_fts and its shadow tables are kept in sync by triggers on books;
+# deleting from them directly would corrupt the search index.
+tables = [t for t in tables if not t.startswith('books_fts')]
 print('Found tables:', tables)
 
 # Order deletion so foreign keys don't block (delete children first)
@@ -37,15 +43,16 @@ try:
 except Exception as e:
     print('Failed to reset sqlite_sequence:', e)
 
+# All deletes above ran in one transaction; commit it once
 conn.commit()
-conn.close()
 
-# Vacuum to rebuild database file and reclaim space
+# Vacuum to rebuild database file and reclaim space. VACUUM cannot run
+# inside a transaction, but it can reuse this connection once committed.
 try:
-    import subprocess
-    subprocess.check_call([sys.executable, '-c', "import sqlite3; conn=sqlite3.connect('library.db'); conn.execute('VACUUM;'); conn.close()"])
+    conn.execute('VACUUM;')
     print('VACUUM completed')
 except Exception as e:
     print('VACUUM failed:', e)
+conn.close()
 
 print('Database cleared successfully')
@@ -1,5 +1,6 @@
 """
-Seed the database with sample/demo data using the `models` API.
+Seed the database with sample/demo data, written in bulk on the `models`
+connection.
 Run from project root: `python .\scripts\seed_demo.py`
 """
 import random
@@ -9,7 +10,6 @@ import os
 # this script from the `scripts/` folder.
 sys.path.insert(0, os.path.abspath(os.path.join(os.path.dirname(__file__), '..')))
 import models
-import sqlite3
 
 # Ensure DB/tables exist
 models.init_db()
@@ -67,87 +67,64 @@ borrowers = [
     ('Jack Black', 'jack@example.com', '555-0109')
 ]
 
-# Add authors
-author_ids = []
-for a in authors:
-    try:
-        aid = models.add_author(a)
-    except Exception:
-        # maybe duplicate or DB empty, try to find existing
-        row = models.get_all_authors()
-        aid = next((r['id'] for r in row if r['name'] == a), None)
-    if aid:
-        author_ids.append(aid)
+# Everything below is written in one transaction on one connection, with a
+# single executemany per table, so the whole seed costs one commit instead
+# of one per row. Re-running the script skips rows that already exist.
+conn = models.get_conn()
+with conn:
+    c = conn.cursor()
 
-# Add publishers
-publisher_ids = []
-for p in publishers:
-    try:
-        pid = models.add_publisher(p)
-    except Exception:
-        row = models.get_all_publishers()
-        pid = next((r['id'] for r in row if r['name'] == p), None)
-    if pid:
-        publisher_ids.append(pid)
+    # Add authors and publishers (names are not unique, so skip existing ones)
+    c.executemany(
+        "INSERT INTO authors (name) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM authors WHERE name = ?)",
+        [(a, a) for a in authors])
+    c.executemany(
+        "INSERT INTO publishers (name) SELECT ? WHERE NOT EXISTS (SELECT 1 FROM publishers WHERE name = ?)",
+        [(p, p) for p in publishers])
 
-# Ensure categories list
-cats = models.get_all_categories()
-if not cats:
-    models.seed_default_categories()
-    cats = models.get_all_categories()
-category_ids = [c['id'] for c in cats]
+    # Ensure categories list
+    category_ids = [r[0] for r in c.execute("SELECT id FROM categories")]
 
-# Add books
-book_ids = []
-for i, (title, isbn) in enumerate(books):
-    cat = random.choice(category_ids) if category_ids else None
-    author = random.choice(authors)
-    publisher = random.choice(publishers)
-    qty = random.randint(1, 5)
-    try:
-        bid = models.add_book(title, isbn, cat, author, publisher, qty)
-    except Exception:
-        # fallback: insert directly
-        conn = sqlite3.connect(models.DB)
-        c = conn.cursor()
-        c.execute("INSERT OR IGNORE INTO books (title,isbn,category_id,author_name,publisher_name,quantity,available) VALUES (?,?,?,?,?,?,?)", (title, isbn, cat, author, publisher, qty, qty))
-        conn.commit()
-        bid = c.lastrowid
-        conn.close()
-    book_ids.append(bid)
+    # Add books, linked to their author/publisher rows by id
+    book_rows = []
+    for title, isbn in books:
+        cat = random.choice(category_ids) if category_ids else None
+        author = random.choice(authors)
+        publisher = random.choice(publishers)
+        qty = random.randint(1, 5)
+        book_rows.append((title, isbn, cat, author, publisher, author, publisher, qty, qty))
+    c.executemany("""
+        INSERT OR IGNORE INTO books (title, isbn, category_id, author_name, publisher_name,
+                                     author_id, publisher_id, quantity, available)
+        VALUES (?, ?, ?, ?, ?,
+                (SELECT MIN(id) FROM authors WHERE name = ?),
+                (SELECT MIN(id) FROM publishers WHERE name = ?), ?, ?)
+    """, book_rows)
+    isbns = [isbn for _, isbn in books]
+    book_ids = [r[0] for r in c.execute(
+        f"SELECT id FROM books WHERE isbn IN ({', '.join('?' * len(isbns))})", isbns)]
 
-# Add borrowers
-borrower_ids = []
-for name, email, phone in borrowers:
-    try:
-        br = models.add_borrower(name, email, phone)
-    except Exception:
-        # try to find existing
-        allb = models.get_all_borrowers()
-        br = next((b['id'] for b in allb if b['email'] == email), None)
-    borrower_ids.append(br)
+    # Add borrowers
+    c.executemany("INSERT OR IGNORE INTO borrowers (name, email, phone) VALUES (?, ?, ?)", borrowers)
+    emails = [email for _, email, _ in borrowers]
+    borrower_ids = [r[0] for r in c.execute(
+        f"SELECT id FROM borrowers WHERE email IN ({', '.join('?' * len(emails))})", emails)]
 
-# Create some loans (only when books available)
-loan_ids = []
-for _ in range(8):
-    b = random.choice(book_ids)
-    br = random.choice(borrower_ids)
-    # Check availability
-    book = models.get_book_by_id(b)
-    if book and book.get('available', 0) > 0:
-        try:
-            lid = models.add_loan(b, br)
-            loan_ids.append(lid)
-        except Exception:
-            pass
+    # Create some loans (only when books available), using the same guarded
+    # decrement and date expressions as models.add_loan/return_loan
+    loan_ids = []
+    for _ in range(8):
+        b = random.choice(book_ids)
+        br = random.choice(borrower_ids)
+        c.execute("UPDATE books SET available = available - 1 WHERE id = ? AND available > 0", (b,))
+        if c.rowcount:
+            c.execute(models._SQL_INSERT_LOAN, (b, br))
+            loan_ids.append((c.lastrowid, b))
 
-# Return a couple of loans to create history
-if loan_ids:
-    for lid in loan_ids[:3]:
-        try:
-            models.return_loan(lid)
-        except Exception:
-            pass
+    # Return a couple of loans to create history
+    for lid, b in loan_ids[:3]:
+        c.execute(models._SQL_RETURN_LOAN, (lid,))
+        c.execute("UPDATE books SET available = available + 1 WHERE id = ?", (b,))
 
 # Print summary counts
 import subprocess, sys
@@ -1,15 +1,27 @@
 import traceback
 import sys
+import importlib
 from pathlib import Path
 # Ensure project root is on sys.path so tests package can be imported
 proj_root = str(Path(__file__).resolve().parents[1])
 if proj_root not in sys.path:
     sys.path.insert(0, proj_root)
 
-import tests.test_borrower_flow as tb
+try:
+    import pytest
+except ImportError:
+    # pytest is not in requirements.txt; fall back to the runner below
+    pytest = None
 
-def run():
-    print('Setting up test module...')
+def run_with_pytest():
+    # Run the whole tests/ directory, stopping at the first failure
+    return pytest.main(['-q', '-x', '--tb=short', '-p', 'no:cacheprovider', str(Path(__file__).resolve().parent)])
+
+def run_module(tb):
+    tests = [(name, fn) for name, fn in vars(tb).items()
+             if name.startswith('test_') and callable(fn)]
+
+    print(f'Setting up {tb.__name__}...')
     try:
         tb.setup_module(None)
     except Exception:
@@ -17,27 +29,24 @@ def run():
         traceback.print_exc()
         return 2
 
-    try:
-        print('Running test_create_borrower_and_delete_flow...')
-        tb.test_create_borrower_and_delete_flow()
-    except AssertionError:
-        print('Test failed:')
-        traceback.print_exc()
+    exit_code = 0
+    for name, fn in tests:
         try:
-            tb.teardown_module(None)
+            print(f'Running {name}...')
+            fn()
+        except AssertionError:
+            print('Test failed:')
+            traceback.print_exc()
+            exit_code = 1
+            break
         except Exception:
-            pass
-        return 1
-    except Exception:
-        print('Test raised exception:')
-        traceback.print_exc()
-        try:
-            tb.teardown_module(None)
-        except Exception:
-            pass
-        return 1
+            print('Test raised exception:')
+            traceback.print_exc()
+            exit_code = 1
+            break
 
-    print('Test passed. Tearing down...')
+    if exit_code == 0:
+        print('Tests passed. Tearing down...')
     try:
         tb.teardown_module(None)
     except Exception:
@@ -45,8 +54,16 @@ def run():
         traceback.print_exc()
         return 1
 
+    return exit_code
+
+def run():
+    # Every tests/test_*.py module, in name order, stopping at the first failure
+    for path in sorted(Path(__file__).resolve().parent.glob('test_*.py')):
+        exit_code = run_module(importlib.import_module(f'tests.{path.stem}'))
+        if exit_code:
+            return exit_code
     return 0
 
 if __name__ == '__main__':
-    exit_code = run()
+    exit_code = run_with_pytest() if pytest is not None else run()
     raise SystemExit(exit_code)
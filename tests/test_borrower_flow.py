@@ -1,23 +1,20 @@
 import os
-import tempfile
+from unittest import mock
 import models
 
-# Use a temporary database file for tests
-DB_OLD = models.DB
+# Use a shared in-memory database for tests. Every thread (and the writer
+# thread) opens its own connection, so a plain ":memory:" database would
+# be a different, empty one on each; the shared-cache URI lets them all
+# see the same data. It lives until its last connection closes.
+_db_patch = mock.patch.object(
+    models, 'DB', 'file:test_library_{}?mode=memory&cache=shared'.format(os.getpid()))
 
 def setup_module(module):
-    fd, path = tempfile.mkstemp(prefix='test_library_', suffix='.db')
-    os.close(fd)
-    models.DB = path
+    _db_patch.start()
     models.init_db()
 
 def teardown_module(module):
-    try:
-        os.remove(models.DB)
-    except Exception:
-        pass
-    finally:
-        models.DB = DB_OLD
+    _db_patch.stop()
 
 
 def test_create_borrower_and_delete_flow():
@@ -33,6 +30,9 @@ def test_create_borrower_and_delete_flow():
     loan_id = models.add_loan(book_id, borrower_id)
     assert loan_id is not None
 
+    # The only copy is out, so a second loan must be refused
+    assert models.add_loan(book_id, borrower_id) is None
+
     # Attempt to delete borrower should be blocked by active loan
     active_count = models.get_active_loans_count_for_borrower(borrower_id)
     assert active_count == 1
@@ -52,6 +52,118 @@ def test_create_borrower_and_delete_flow():
     # Now there should be 0 active loans
     assert models.get_active_loans_count_for_borrower(borrower_id) == 0
 
-    # Now deleting borrower should succeed (no active loans)
-    models.delete_borrower(borrower_id)
-    assert models.get_borrower_by_id(borrower_id) is None
+    # The returned loan is still loan history referencing the borrower, so
+    # the foreign key keeps the borrower from being deleted
+    try:
+        models.delete_borrower(borrower_id)
+        deleted = True
+    except models.IntegrityError:
+        deleted = False
+    assert deleted is False
+    assert models.get_borrower_by_id(borrower_id) is not None
+
+
+def test_transaction_groups_writes():
+    # Writes in a committed block are all kept, and later writes can use
+    # ids returned by earlier ones
+    with models.transaction():
+        borrower_id = models.add_borrower('Group User', 'group@example.com', None)
+        book_id = models.add_book('Group Book', 'ISBN-GROUP', None, 'Author', 'Publisher', 1)
+        loan_id = models.add_loan(book_id, borrower_id)
+    assert loan_id is not None
+    assert models.get_active_loans_count_for_borrower(borrower_id) == 1
+
+    # An exception leaving the block undoes every write made in it
+    try:
+        with models.transaction():
+            other_id = models.add_borrower('Rolled Back', 'rollback@example.com', None)
+            models.return_loan(loan_id)
+            raise RuntimeError('abort')
+    except RuntimeError:
+        pass
+    assert models.get_borrower_by_id(other_id) is None
+    assert models.get_active_loans_count_for_borrower(borrower_id) == 1
+
+
+def test_update_book_refused_below_active_loans():
+    borrower_id = models.add_borrower('Edit User', 'edit@example.com', None)
+    book_id = models.add_book('Edit Book', 'ISBN-EDIT', None, 'Author', 'Publisher', 1)
+    models.add_loan(book_id, borrower_id)
+
+    # One copy is out, so the quantity cannot drop to 0
+    active = models.update_book(book_id, 'Edit Book', 'ISBN-EDIT', None, 'Ghost', 'GhostPub', 0)
+    assert active == 1
+    book = models.get_book_by_id(book_id)
+    assert (book['quantity'], book['available'], book['author_name']) == (1, 0, 'Author')
+
+    # The refused edit must not leave its new author/publisher behind
+    assert 'Ghost' not in [a['name'] for a in models.get_all_authors()]
+    assert 'GhostPub' not in [p['name'] for p in models.get_all_publishers()]
+
+    # Raising the quantity keeps the loaned copy out of the available count
+    assert models.update_book(book_id, 'Edit Book', 'ISBN-EDIT', None, 'Author', 'Publisher', 2) == 1
+    book = models.get_book_by_id(book_id)
+    assert (book['quantity'], book['available']) == (2, 1)
+
+
+def test_book_search():
+    models.add_book('Dune Messiah', 'ISBN-FTS-1', None, 'Frank Herbert', 'Ace', 1)
+    models.add_book('Emma', 'ISBN-FTS-2', None, 'Jane Austen', 'Penguin', 1)
+    models.add_book('The "Quoted" Book', 'ISBN-FTS-3', None, 'Anon', 'Penguin', 1)
+
+    def titles(search):
+        return {b['title'] for b in models.get_all_books(search)}
+
+    # Terms of 3+ characters go through the full-text index, shorter ones
+    # fall back to LIKE; both match substrings and ignore case
+    assert 'Dune Messiah' in titles('dUNE')
+    assert 'Dune Messiah' in titles('ssia')
+    assert titles('eM') >= {'Emma'}
+    assert 'Dune Messiah' not in titles('eM')
+    assert 'Emma' in titles('austen')
+
+    # ISBNs are searchable too
+    assert titles('FTS-2') == {'Emma'}
+    assert titles('ISBN-FTS') == {'Dune Messiah', 'Emma', 'The "Quoted" Book'}
+
+    # Quotes in the term are matched literally, not parsed as query syntax
+    assert titles('"Quoted') == {'The "Quoted" Book'}
+    assert titles('"x') == set()
+    assert titles('x"') == set()
+    assert titles('zz"q') == set()
+    assert {b['title'] for b in models.get_available_books('"Quo')} == {'The "Quoted" Book'}
+
+
+def test_overdue_loans():
+    borrower_id = models.add_borrower('Late User', 'late@example.com', None)
+    loans = {}
+    for name in ('today', 'yesterday', 'hour_ago', 'returned'):
+        book_id = models.add_book(f'Due {name}', f'ISBN-DUE-{name}', None, 'Author', 'Publisher', 1)
+        loans[name] = models.add_loan(book_id, borrower_id)
+    models.return_loan(loans['returned'])
+    overdue_before = models.get_total_overdue_loans()
+
+    # Due dates in the formats the app stores: date-only (counts until the
+    # end of that day) and full ISO datetimes, all relative to SQLite's now
+    due_dates = {
+        'today': "date('now')",
+        'yesterday': "date('now', '-1 day')",
+        'hour_ago': "strftime('%Y-%m-%dT%H:%M:%f', 'now', '-1 hour')",
+        'returned': "date('now', '-1 day')",
+    }
+    conn = models.get_conn()
+    with conn:
+        for name, expr in due_dates.items():
+            conn.execute(f"UPDATE loans SET due_date = {expr} WHERE id = ?", (loans[name],))
+
+    flags = {row['id']: row['is_overdue'] for row in models.get_all_loans()}
+    assert not flags[loans['today']]
+    assert flags[loans['yesterday']]
+    assert flags[loans['hour_ago']]
+    # A returned loan is never overdue, however late it was
+    assert not flags[loans['returned']]
+
+    overdue_ids = {row['id'] for row in models.get_overdue_loans()}
+    assert overdue_ids >= {loans['yesterday'], loans['hour_ago']}
+    assert not overdue_ids & {loans['today'], loans['returned']}
+    assert models.get_total_overdue_loans() == overdue_before + 2
@@ -0,0 +1,11 @@
+"""
+WSGI entry point for production servers.
+
+    gunicorn -w 4 -k gthread --threads 8 wsgi:app
+
+Importing app initializes the database and starts logging, exactly as
+running app.py does, but leaves serving to the WSGI server.
+"""
+from app import app
+
+__all__ = ['app']